@@ -1,195 +1,145 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, jsonify, request, abort, make_response, Response
 from flask_cors import CORS
-import pandas as pd
 import os
 import json
 import datetime
 from datetime import datetime, timedelta
 import threading
-import time
-import subprocess
-import re
-
-app = Flask(__name__, static_folder='../frontend/dist', static_url_path='/')
+from box_store import (DEFAULT_BOX_ID, EVENT_COLUMNS, get_box, is_valid_box_id,
+                       get_last_device_event, should_log_connection, should_log_disconnection,
+                       log_device_event)
+from sessions import (pair_sessions, active_session, history_matches_events, parse_event_time,
+                      add_to_daily_rollups)
+from heatmap import build_heatmap
+from static_assets import build_static_manifest, choose_encoding
+from profiler import profile_lock, sample_stacks, format_collapsed, PROFILE_MAX_SECONDS
+from usb_monitor import (USB_CHECK_INTERVAL, PHONE_PATTERNS, get_usb_devices, extract_device_info,
+                         is_phone_device, get_connected_phones, send_monitor_command,
+                         spawn_monitor_process)
+
+# Frontend build is served from an in-memory manifest by serve_react, not Flask's static route
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
-DEVICE_EVENTS_FILE = 'device_events.csv'
-USER_CONFIG_FILE = 'user_config.json'
-
-# USB Device Monitor Configuration
-USB_CHECK_INTERVAL = 3  # Check every 3 seconds
-PHONE_PATTERNS = [
-    r'iPhone|iPad|iPod',  # Apple devices
-    r'Samsung|Galaxy',    # Samsung devices
-    r'Google|Pixel',      # Google devices
-    r'OnePlus',          # OnePlus devices
-    r'Huawei|Honor',     # Huawei devices
-    r'Xiaomi|Mi|Redmi',  # Xiaomi devices
-    r'LG.*Phone',        # LG phones
-    r'HTC',              # HTC devices
-    r'Sony.*Xperia',     # Sony devices
-    r'Motorola|Moto',    # Motorola devices
-    r'Nokia',            # Nokia devices
-    r'OPPO|Vivo',        # OPPO/Vivo devices
-]
-
-# Global variables for device monitoring
-device_monitor_running = False
-device_monitor_thread = None
-
-def init_events_file():
-    if not os.path.exists(DEVICE_EVENTS_FILE):
-        df = pd.DataFrame(columns=['timestamp', 'isConnected', 'deviceName', 'deviceId'])
-        df.to_csv(DEVICE_EVENTS_FILE, index=False)
-    else:
-        # Check if columns exist, add if missing for backward compatibility
-        df = pd.read_csv(DEVICE_EVENTS_FILE)
-        if 'deviceName' not in df.columns:
-            df['deviceName'] = ''  # Add empty device name for existing records
-        if 'deviceId' not in df.columns:
-            df['deviceId'] = ''  # Add empty device ID for existing records
-        df.to_csv(DEVICE_EVENTS_FILE, index=False)
-
-def init_user_config():
-    default_config = {
-        "dailyTarget": 120,  # 120 minutes = 2 hours per day
-        "settings": {
-            "autoReminder": True,
-            "callFiltering": True,
-            "zenHours": "20:00-22:00",
-            "zenDays": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-        }
-    }
-    if not os.path.exists(USER_CONFIG_FILE):
-        with open(USER_CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(default_config, f, indent=2)
-
-def load_user_config():
-    try:
-        with open(USER_CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        init_user_config()
-        return load_user_config()
-
-def save_user_config(config):
-    with open(USER_CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2)
-
-def migrate_config_if_needed():
-    """Migrate old config format to new format if needed"""
-    config = load_user_config()
-    
-    # If we have weeklyTarget but no dailyTarget, migrate
-    if "weeklyTarget" in config and "dailyTarget" not in config:
-        config["dailyTarget"] = config["weeklyTarget"] // 7
-        del config["weeklyTarget"]
-        save_user_config(config)
-        print("Migrated config from weeklyTarget to dailyTarget")
-    
-    # Ensure dailyTarget exists
-    if "dailyTarget" not in config:
-        config["dailyTarget"] = 120  # Default 2 hours
-        save_user_config(config)
+FRONTEND_DIST = os.path.join(app.root_path, '..', 'frontend', 'dist')
+static_manifest = build_static_manifest(FRONTEND_DIST)
+
+# Box whose events the local USB monitor process records
+MONITOR_BOX_ID = os.environ.get('ZENBOX_BOX_ID', DEFAULT_BOX_ID)
+
+# Upper bound on events accepted by one batch ingestion request
+MAX_BATCH_EVENTS = 1000
+
+# Sampling profiler endpoint is opt-in; it returns 404 unless this is set
+PROFILER_ENABLED = os.environ.get('ZENBOX_DEBUG_PROFILE', '') == '1'
+
+# Default and maximum heatmap window, in days
+HEATMAP_DEFAULT_DAYS = 28
+HEATMAP_MAX_DAYS = 3660
+
+def load_user_config(box):
+    return box.load_config()
 
-init_events_file()
-init_user_config()
-migrate_config_if_needed()
+def save_user_config(box, config):
+    box.save_config(config)
 
-def get_data():
-    df = pd.read_csv(DEVICE_EVENTS_FILE)
-    return df.to_dict(orient='records')
+def get_data(box):
+    return [dict(zip(EVENT_COLUMNS, event)) for event in box.get_events()]
 
 def get_sessions_from_data(data):
     """Process raw device events and return completed sessions"""
-    sessions = []
-    connected = False
-    connected_timestamp = None
-    
-    for entry in data:
-        time = entry[0]
-        # Handle both boolean and string types
-        if isinstance(entry[1], bool):
-            entry_connected = entry[1]
-        else:
-            entry_connected_str = str(entry[1]).lower()
-            entry_connected = entry_connected_str == "true"
-        
-        # Handle optional device name and device ID (3rd and 4th columns) - backwards compatible
-        device_name = entry[2] if len(entry) > 2 else ""
-        device_id = entry[3] if len(entry) > 3 else ""
-        
-        # Try to parse with seconds first, fallback to minutes only
-        try:
-            parsed_time = datetime.strptime(time, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            try:
-                parsed_time = datetime.strptime(time, "%Y-%m-%d %H:%M")
-            except ValueError:
-                continue  # Skip invalid timestamps
-        
-        if entry_connected and not connected:
-            connected = True
-            connected_timestamp = parsed_time
-        elif not entry_connected and connected:
-            if connected_timestamp:
-                duration = (parsed_time - connected_timestamp).total_seconds()
-                sessions.append({
-                    "start": connected_timestamp.isoformat(),
-                    "end": parsed_time.isoformat(),
-                    "duration": duration
-                })
-            connected = False
-            connected_timestamp = None
+    sessions, open_start = pair_sessions(data)
     
     # Handle case where session is still active (last event was connection)
-    if connected and connected_timestamp:
-        # Create an ongoing session with current time as end
-        current_time = datetime.now()
-        duration = (current_time - connected_timestamp).total_seconds()
-        sessions.append({
-            "start": connected_timestamp.isoformat(),
-            "end": current_time.isoformat(),
-            "duration": duration,
-            "isActive": True  # Mark as currently active session
-        })
+    if open_start is not None:
+        sessions.append(active_session(open_start))
     
     return sessions
 
+def daily_rollups(sessions):
+    """Zen seconds and session counts per session start day"""
+    rollups = {}
+    for session in sessions:
+        add_to_daily_rollups(rollups, session)
+    return rollups
+
+def get_box_sessions(box, data):
+    """Sessions, daily rollups and history version for a box's events.
+
+    A recomputed history snapshot that matches the events is reused, so only the
+    events after it are paired and rolled up. The version is the snapshot's
+    generatedAt ('' without one); a recompute may change already completed
+    sessions, so cursors from another version are no longer valid.
+    """
+    history = box.get_session_history()
+    if not history_matches_events(history, data) or history.get("dailyRollups") is None:
+        sessions = get_sessions_from_data(data)
+        return sessions, daily_rollups(sessions), ""
+
+    event_count = history["eventCount"]
+
+    open_start = history.get("openSessionStart")
+    open_start = datetime.fromisoformat(open_start) if open_start else None
+    tail_sessions, open_start = pair_sessions(data[event_count:], open_start)
+    if open_start is not None:
+        tail_sessions.append(active_session(open_start))
+    rollups = {day: dict(rollup) for day, rollup in history["dailyRollups"].items()}
+    for session in tail_sessions:
+        add_to_daily_rollups(rollups, session)
+    return history["sessions"] + tail_sessions, rollups, history.get("generatedAt", "")
+
+def session_cursor(sessions, version=""):
+    """Cursor marking the completed sessions a client already holds:
+    '<count>:<last end>@<history version>'"""
+    completed = [session for session in sessions if not session.get("isActive")]
+    last_end = completed[-1]["end"] if completed else ""
+    return f"{len(completed)}:{last_end}@{version}"
+
+def sessions_since(sessions, since, version=""):
+    """Sessions a client holding the `since` cursor is missing.
+
+    Completed sessions only change when the history is recomputed, which changes
+    its version, so a valid cursor from the same version lets us send only
+    sessions after it (including the active one, whose duration grows).
+    Returns (is_full, offset, sessions); an unknown cursor falls back to everything.
+    """
+    if since:
+        position, _, cursor_version = since.rpartition("@")
+        count, _, last_end = position.partition(":")
+        if cursor_version == version and count.isdigit():
+            count = int(count)
+            if count == 0 and not last_end:
+                return False, 0, sessions
+            if 0 < count <= len(sessions) and sessions[count - 1]["end"] == last_end \
+                    and not sessions[count - 1].get("isActive"):
+                return False, count, sessions[count:]
+    return True, 0, sessions
+
 def calculate_weekly_target(daily_target):
     """Calculate weekly target from daily target"""
     return daily_target * 7
 
-def calculate_today_zen_time(sessions):
-    """Calculate today's zen time in minutes from sessions"""
-    today = datetime.now().date()
-    today_seconds = 0
-    
-    for session in sessions:
-        session_date = datetime.fromisoformat(session["start"]).date()
-        if session_date == today:
-            today_seconds += session["duration"]
-    
-    return int(today_seconds // 60)  # Convert to minutes
+def day_seconds(rollups, date):
+    """Zen seconds of sessions that started on a date"""
+    return rollups.get(date.isoformat(), {}).get("seconds", 0)
+
+def calculate_today_zen_time(rollups):
+    """Calculate today's zen time in minutes from daily rollups"""
+    return int(day_seconds(rollups, datetime.now().date()) // 60)  # Convert to minutes
 
-def calculate_zen_points(sessions):
+def calculate_total_time(rollups):
+    """Total zen seconds over all days"""
+    return sum(rollup["seconds"] for rollup in rollups.values())
+
+def calculate_zen_points(rollups):
     """Calculate total zen points (1 point per second)"""
-    total_seconds = sum(session["duration"] for session in sessions)
-    return int(total_seconds)
+    return int(calculate_total_time(rollups))
 
-def calculate_today_points(sessions):
+def calculate_today_points(rollups):
     """Calculate today's zen points"""
-    today = datetime.now().date()
-    today_seconds = 0
-    
-    for session in sessions:
-        session_date = datetime.fromisoformat(session["start"]).date()
-        if session_date == today:
-            today_seconds += session["duration"]
-    
-    return int(today_seconds)
+    return int(day_seconds(rollups, datetime.now().date()))
 
-def calculate_weekly_data(sessions, daily_target):
+def calculate_weekly_data(rollups, daily_target):
     """Calculate weekly data for the past 7 days"""
     today = datetime.now().date()
     weekly_data = []
@@ -197,18 +147,9 @@ def calculate_weekly_data(sessions, daily_target):
     # Create data for the past 7 days
     for i in range(6, -1, -1):  # 6 days ago to today
         date = today - timedelta(days=i)
-        day_name = date.strftime('%a')
-        
-        # Calculate zen time for this day
-        day_minutes = 0
-        for session in sessions:
-            session_date = datetime.fromisoformat(session["start"]).date()
-            if session_date == date:
-                day_minutes += session["duration"] // 60
-        
         weekly_data.append({
-            "day": day_name,
-            "zen": int(day_minutes),
+            "day": date.strftime('%a'),
+            "zen": int(day_seconds(rollups, date) // 60),
             "target": daily_target
         })
     
@@ -232,292 +173,37 @@ def is_currently_in_zen_mode(sessions, data):
     # If the last event was a disconnection, user is NOT in zen mode
     return last_connected
 
-def get_last_device_event(device_id, device_name=""):
-    """Get the last event for a device by ID, fallback to name if ID is empty"""
-    try:
-        if not os.path.exists(DEVICE_EVENTS_FILE):
-            return None
-        
-        df = pd.read_csv(DEVICE_EVENTS_FILE)
-        if df.empty:
-            return None
-        
-        # Add deviceId column if missing for backward compatibility
-        if 'deviceId' not in df.columns:
-            df['deviceId'] = ''
-        
-        # First try to find by device ID if provided
-        if device_id:
-            device_events = df[df['deviceId'] == device_id]
-            if not device_events.empty:
-                last_event = device_events.iloc[-1]
-                return {
-                    'timestamp': last_event['timestamp'],
-                    'isConnected': str(last_event['isConnected']).lower() == 'true',
-                    'deviceName': last_event.get('deviceName', ''),
-                    'deviceId': last_event.get('deviceId', '')
-                }
-        
-        # Fallback to device name if ID not found or not provided
-        if device_name:
-            device_events = df[df['deviceName'] == device_name]
-            if not device_events.empty:
-                last_event = device_events.iloc[-1]
-                return {
-                    'timestamp': last_event['timestamp'],
-                    'isConnected': str(last_event['isConnected']).lower() == 'true',
-                    'deviceName': last_event.get('deviceName', ''),
-                    'deviceId': last_event.get('deviceId', '')
-                }
-        
-        return None
-    except Exception as e:
-        print(f"Error getting last device event: {e}")
-        return None
-
-def should_log_connection(device_id, device_name):
-    """Check if we should log a connection event (avoid duplicates)"""
-    last_event = get_last_device_event(device_id, device_name)
-    
-    # If no previous event, log the connection
-    if not last_event:
-        return True
-    
-    # If last event was disconnection, log the connection
-    if not last_event['isConnected']:
-        return True
-    
-    # If last event was connection, don't log duplicate
-    return False
-
-def should_log_disconnection(device_id, device_name):
-    """Check if we should log a disconnection event"""
-    last_event = get_last_device_event(device_id, device_name)
-    
-    # If no previous event, don't log disconnection (nothing was connected)
-    if not last_event:
-        return False
-    
-    # If last event was connection, log the disconnection
-    if last_event['isConnected']:
-        return True
-    
-    # If last event was disconnection, don't log duplicate
-    return False
-
-def log_device_event(is_connected, device_name="", device_id=""):
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        df = pd.DataFrame([[timestamp, str(is_connected), device_name, device_id]], 
-                         columns=['timestamp', 'isConnected', 'deviceName', 'deviceId'])
-        if os.path.exists(DEVICE_EVENTS_FILE):
-            df.to_csv(DEVICE_EVENTS_FILE, mode='a', header=False, index=False)
-        else:
-            df.to_csv(DEVICE_EVENTS_FILE, index=False)
-    except Exception as e:
-        print(f"Error logging device event: {e}")
-        raise
-
-def get_usb_devices():
-    """Get list of connected USB devices using lsusb"""
-    try:
-        # Run lsusb command
-        result = subprocess.run(['lsusb'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            return result.stdout.strip().split('\n')
-        else:
-            print(f"lsusb command failed with return code {result.returncode}")
-            return []
-    except subprocess.TimeoutExpired:
-        print("lsusb command timed out")
-        return []
-    except FileNotFoundError:
-        print("lsusb command not found. Make sure usbutils is installed.")
-        return []
-    except Exception as e:
-        print(f"Error running lsusb: {e}")
-        return []
-
-def extract_device_info(lsusb_line):
-    """Extract device ID and name from lsusb output line"""
-    try:
-        # lsusb output format: "Bus 001 Device 002: ID 1234:5678 Device Name"
-        # We want to extract both the device ID and name
-        parts = lsusb_line.split(': ID ')
-        if len(parts) > 1:
-            # Get everything after "ID "
-            device_part = parts[1]
-            # Split into ID and name parts
-            id_and_name = device_part.split(' ', 1)
-            if len(id_and_name) >= 2:
-                device_id = id_and_name[0].strip()  # e.g., "1234:5678"
-                device_name = id_and_name[1].strip()  # e.g., "Device Name"
-                return device_id, device_name
-            elif len(id_and_name) == 1:
-                # Only ID available, no name
-                device_id = id_and_name[0].strip()
-                return device_id, ""
-        return "", ""
-    except Exception as e:
-        print(f"Error extracting device info from '{lsusb_line}': {e}")
-        return "", ""
-
-def is_phone_device(device_name):
-    """Check if device name matches phone patterns"""
-    if not device_name:
-        return False
-    
-    for pattern in PHONE_PATTERNS:
-        if re.search(pattern, device_name, re.IGNORECASE):
-            return True
-    return False
-
-def get_connected_phones():
-    """Get dict of currently connected phone devices (deduplicated by device ID)"""
-    phones = {}  # device_id -> device_name mapping
-    usb_devices = get_usb_devices()
-    
-    for device_line in usb_devices:
-        device_id, device_name = extract_device_info(device_line)
-        if device_id and device_name and is_phone_device(device_name):
-            # Use device ID as key to prevent duplicates
-            # If we already have this device ID, prefer the one with more descriptive name
-            if device_id not in phones or len(device_name) > len(phones[device_id]):
-                phones[device_id] = device_name
-    
-    return phones
-
-def get_all_known_devices():
-    """Get all devices that have been seen before from the CSV"""
-    try:
-        if not os.path.exists(DEVICE_EVENTS_FILE):
-            return {}
-        
-        df = pd.read_csv(DEVICE_EVENTS_FILE)
-        if df.empty:
-            return {}
-        
-        # Add deviceId column if missing for backward compatibility
-        if 'deviceId' not in df.columns:
-            df['deviceId'] = ''
-        
-        known_devices = {}
-        
-        # Get all unique device IDs and their most recent names
-        for _, row in df.iterrows():
-            device_id = row.get('deviceId', '')
-            device_name = row.get('deviceName', '')
-            
-            if device_id:
-                # Use device ID as primary key
-                known_devices[device_id] = device_name
-            elif device_name:
-                # If no device ID, use device name as fallback key
-                known_devices[device_name] = device_name
-        
-        return known_devices
-    except Exception as e:
-        print(f"Error getting known devices: {e}")
-        return {}
-
-def device_monitor():
-    """Background thread function to monitor USB devices"""
-    global device_monitor_running
-    
-    print("USB Device Monitor started")
-    
-    # Log initial connections if any devices are connected at startup
-    current_phones = get_connected_phones()
-    if current_phones:
-        print(f"Initial connected phones: {current_phones}")
-        for device_id, device_name in current_phones.items():
-            if should_log_connection(device_id, device_name):
-                try:
-                    log_device_event(True, device_name, device_id)
-                    print(f"Auto-logged initial connection: {device_name} (ID: {device_id})")
-                except Exception as e:
-                    print(f"Error logging initial connection for {device_name}: {e}")
-    
-    while device_monitor_running:
-        try:
-            time.sleep(USB_CHECK_INTERVAL)
-            
-            if not device_monitor_running:
-                break
-                
-            current_phones = get_connected_phones()
-            
-            # Get all devices that have been seen before
-            previously_seen_devices = get_all_known_devices()
-            
-            # Check for newly connected devices
-            for device_id, device_name in current_phones.items():
-                if should_log_connection(device_id, device_name):
-                    try:
-                        log_device_event(True, device_name, device_id)
-                        print(f"Auto-detected connection: {device_name} (ID: {device_id})")
-                    except Exception as e:
-                        print(f"Error logging connection for {device_name}: {e}")
-            
-            # Check for disconnected devices
-            for device_id, device_name in previously_seen_devices.items():
-                # If device was previously seen but not currently connected
-                if device_id not in current_phones:
-                    if should_log_disconnection(device_id, device_name):
-                        try:
-                            log_device_event(False, device_name, device_id)
-                            print(f"Auto-detected disconnection: {device_name} (ID: {device_id})")
-                        except Exception as e:
-                            print(f"Error logging disconnection for {device_name}: {e}")
-            
-        except Exception as e:
-            print(f"Error in device monitor: {e}")
-            # Continue monitoring even if there's an error
-            time.sleep(USB_CHECK_INTERVAL)
-    
-    print("USB Device Monitor stopped")
+def box_route(rule, **options):
+    """Register an API route per box, plus its legacy /api path for the default box"""
+    def decorator(view):
+        app.route(f'/api/boxes/<box_id>{rule}', **options)(view)
+        app.route(f'/api{rule}', defaults={'box_id': DEFAULT_BOX_ID}, **options)(view)
+        return view
+    return decorator
+
+@app.url_value_preprocessor
+def validate_box_id(endpoint, values):
+    """Reject malformed box IDs before they reach a view or the filesystem"""
+    if values and 'box_id' in values and not is_valid_box_id(values['box_id']):
+        abort(make_response(jsonify({
+            "status": "error",
+            "message": "Box ID must be 1-64 letters, digits, '-' or '_'"
+        }), 400))
 
-def start_device_monitor():
-    """Start the USB device monitoring thread"""
-    global device_monitor_running, device_monitor_thread
-    
-    if device_monitor_running:
-        print("Device monitor is already running")
-        return
-    
-    device_monitor_running = True
-    device_monitor_thread = threading.Thread(target=device_monitor, daemon=True)
-    device_monitor_thread.start()
-    print("Device monitor thread started")
-
-def stop_device_monitor():
-    """Stop the USB device monitoring thread"""
-    global device_monitor_running, device_monitor_thread
-    
-    if not device_monitor_running:
-        print("Device monitor is not running")
-        return
-    
-    print("Stopping device monitor...")
-    device_monitor_running = False
-    
-    if device_monitor_thread and device_monitor_thread.is_alive():
-        device_monitor_thread.join(timeout=5)
-    
-    print("Device monitor stopped")
+def monitor_box_error():
+    return jsonify({
+        "status": "error",
+        "message": f"The USB monitor records events for box '{MONITOR_BOX_ID}' only"
+    }), 400
 
-@app.route('/api/debug/events')
-def debug_events():
+@box_route('/debug/events')
+def debug_events(box_id):
     """Debug endpoint to see raw events and processing"""
     try:
-        if not os.path.exists(DEVICE_EVENTS_FILE):
-            return jsonify({"events": [], "message": "No events file"})
-        
-        df = pd.read_csv(DEVICE_EVENTS_FILE)
-        if df.empty:
+        data = get_box(box_id).get_events()
+        if not data:
             return jsonify({"events": [], "message": "No events"})
         
-        data = df.values.tolist()
         sessions = get_sessions_from_data(data)
         
         # Get last few events for debugging
@@ -537,13 +223,59 @@ def debug_events():
             "message": "Error processing events"
         }), 500
 
-@app.route('/api/data')
-def api_data():
-    return jsonify(get_data())
+@app.route('/api/debug/profile')
+def debug_profile():
+    """Sample all threads of this process and the monitor process for ?seconds=N"""
+    if not PROFILER_ENABLED:
+        return jsonify({
+            "status": "error",
+            "message": "Profiling is disabled; set ZENBOX_DEBUG_PROFILE=1 to enable it"
+        }), 404
+    
+    seconds = request.args.get('seconds', default=5, type=float)
+    if seconds <= 0 or seconds > PROFILE_MAX_SECONDS:
+        return jsonify({
+            "status": "error",
+            "message": f"seconds must be between 0 and {PROFILE_MAX_SECONDS}"
+        }), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "A profile is already running"}), 409
+    
+    try:
+        # Profile the monitor process over its socket while sampling this one
+        monitor_reply = {}
+        monitor_thread = threading.Thread(
+            target=lambda: monitor_reply.update(
+                send_monitor_command("profile", timeout=seconds + 5, seconds=seconds) or {}),
+            name="profile-monitor-request")
+        monitor_thread.start()
+        counts, rounds = sample_stacks(seconds, exclude_thread_ids=[monitor_thread.ident])
+        monitor_thread.join()
+    finally:
+        profile_lock.release()
+    
+    if monitor_reply.get("status") == "success":
+        for stack, count in monitor_reply["stacks"].items():
+            counts[f"usb_monitor[{monitor_reply['pid']}];{stack}"] += count
+    
+    if request.args.get('format') == 'collapsed':
+        return Response(format_collapsed(counts) + "\n", mimetype='text/plain')
+    return jsonify({
+        "status": "success",
+        "seconds": seconds,
+        "samples": rounds,
+        "monitorSamples": monitor_reply.get("samples", 0),
+        "stacks": [{"stack": stack, "count": count} for stack, count in counts.most_common()]
+    })
+
+@box_route('/data')
+def api_data(box_id):
+    return jsonify(get_data(get_box(box_id)))
 
-@app.route('/api/device/connected', methods=['POST'])
-def device_connected():
+@box_route('/device/connected', methods=['POST'])
+def device_connected(box_id):
     try:
+        box = get_box(box_id)
         # Get optional device name and ID from request body - backward compatible
         device_name = ''
         device_id = ''
@@ -557,17 +289,18 @@ def device_connected():
             device_id = ''
         
         # Only log if we should (avoid duplicates)
-        if should_log_connection(device_id, device_name):
-            log_device_event(True, device_name, device_id)
+        if should_log_connection(box, device_id, device_name):
+            log_device_event(box, True, device_name, device_id)
             return jsonify({"status": "success", "message": "Device connection logged"})
         else:
             return jsonify({"status": "success", "message": "Device already connected, no duplicate logged"})
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to log connection: {str(e)}"}), 500
 
-@app.route('/api/device/disconnected', methods=['POST'])
-def device_disconnected():
+@box_route('/device/disconnected', methods=['POST'])
+def device_disconnected(box_id):
     try:
+        box = get_box(box_id)
         # Get optional device name and ID from request body - backward compatible
         device_name = ''
         device_id = ''
@@ -581,36 +314,153 @@ def device_disconnected():
             device_id = ''
         
         # Only log if we should (device was actually connected)
-        if should_log_disconnection(device_id, device_name):
-            log_device_event(False, device_name, device_id)
+        if should_log_disconnection(box, device_id, device_name):
+            log_device_event(box, False, device_name, device_id)
             return jsonify({"status": "success", "message": "Device disconnection logged"})
         else:
             return jsonify({"status": "success", "message": "Device was not connected, no disconnection logged"})
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to log disconnection: {str(e)}"}), 500
 
-@app.route('/api/device/monitor/status')
-def monitor_status():
-    """Get USB device monitor status"""
-    current_phones = get_connected_phones()
-    return jsonify({
-        "monitoring": device_monitor_running,
-        "connectedDevices": list(current_phones.values()),
-        "connectedDeviceIds": list(current_phones.keys()),
-        "deviceMapping": current_phones,
-        "checkInterval": USB_CHECK_INTERVAL,
-        "phonePatterns": PHONE_PATTERNS
-    })
+@box_route('/device/events/batch', methods=['POST'])
+def device_events_batch(box_id):
+    """Ingest many timestamped events from a remote agent in one idempotent write.
+
+    Events carry client-generated IDs; IDs already processed (or repeated within
+    the batch) are reported as duplicates. Events that are not a state transition
+    for their device are ignored, matching the single-event endpoints, and their
+    IDs are remembered too so a retried batch is a no-op. Sessions are paired over
+    the box's whole event log in file order, so events older than the box's last
+    stored event (for any device) are rejected rather than appended out of order.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return jsonify({
+            "status": "error",
+            "message": "Request body must be an object with an 'events' list"
+        }), 400
+    if len(data['events']) > MAX_BATCH_EVENTS:
+        return jsonify({
+            "status": "error",
+            "message": f"A batch may contain at most {MAX_BATCH_EVENTS} events"
+        }), 400
+
+    rejected = []
+    parsed_events = []
+    for event in data['events']:
+        event_id = event.get('id') if isinstance(event, dict) else None
+        if not isinstance(event_id, str) or not event_id:
+            rejected.append({"id": event_id, "message": "Event id must be a non-empty string"})
+            continue
+        parsed_time = parse_event_time(event.get('timestamp'))
+        if parsed_time is None:
+            rejected.append({"id": event_id, "message": "Invalid or missing timestamp; expected ISO 8601 "
+                                                        "such as 2025-07-12T10:30:00Z or 2025-07-12 10:30:00"})
+            continue
+        if not isinstance(event.get('isConnected'), bool):
+            rejected.append({"id": event_id, "message": "isConnected must be a boolean"})
+            continue
+        parsed_events.append((parsed_time, event_id, event['isConnected'],
+                              str(event.get('deviceName') or ''), str(event.get('deviceId') or '')))
+
+    # Apply in timestamp order so buffered events pair into sessions correctly
+    parsed_events.sort(key=lambda e: e[0])
+
+    duplicates = []
+
+    def select_events():
+        """Judge the batch against the box's state; runs under the box's append lock"""
+        accepted_rows = []
+        ignored = []
+        last_event = box.get_last_event()
+        last_time = parse_event_time(last_event['timestamp']) if last_event else None
+        batch_ids = set()
+        batch_state = {}  # device key -> isConnected after this batch's accepted events
+        for parsed_time, event_id, is_connected, device_name, device_id in parsed_events:
+            if event_id in batch_ids or box.has_event_id(event_id):
+                duplicates.append(event_id)
+                continue
+            batch_ids.add(event_id)
+
+            # Appending before the box's last event would scramble session pairing;
+            # the batch is sorted, so its accepted events never go backwards
+            if last_time is not None and parsed_time < last_time:
+                rejected.append({"id": event_id, "message": "Timestamp is earlier than the box's last stored event"})
+                continue
+
+            device_key = device_id or device_name
+            if device_key in batch_state:
+                last_connected = batch_state[device_key]
+            else:
+                last_device_event = get_last_device_event(box, device_id, device_name)
+                last_connected = last_device_event['isConnected'] if last_device_event else None
+
+            # Only state transitions are logged, as with should_log_connection/disconnection
+            if is_connected == bool(last_connected):
+                ignored.append(event_id)
+                continue
+
+            batch_state[device_key] = is_connected
+            accepted_rows.append([parsed_time.strftime("%Y-%m-%d %H:%M:%S"), is_connected,
+                                  device_name, device_id, event_id])
+        return accepted_rows, ignored
+
+    try:
+        box = get_box(box_id)
+        accepted_rows, ignored = box.ingest_events(select_events)
+
+        return jsonify({
+            "status": "success",
+            "message": f"Logged {len(accepted_rows)} of {len(data['events'])} events",
+            "accepted": [row[4] for row in accepted_rows],
+            "duplicates": duplicates,
+            "ignored": ignored,
+            "rejected": rejected
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Failed to ingest events: {str(e)}"}), 500
 
-@app.route('/api/device/monitor/start', methods=['POST'])
-def start_monitor():
-    """Start USB device monitoring"""
+@box_route('/device/monitor/status')
+def monitor_status(box_id):
+    """Get USB device monitor status from the monitor process"""
+    reply = send_monitor_command("status")
+    if reply is None or box_id != MONITOR_BOX_ID:
+        return jsonify({
+            "monitoring": False,
+            "monitorProcess": reply is not None,
+            "monitorBoxId": MONITOR_BOX_ID,
+            "connectedDevices": [],
+            "connectedDeviceIds": [],
+            "deviceMapping": {},
+            "checkInterval": USB_CHECK_INTERVAL,
+            "phonePatterns": PHONE_PATTERNS
+        })
+    
+    status = {key: value for key, value in reply.items() if key != "status"}
+    status["monitorProcess"] = True
+    status["monitorBoxId"] = MONITOR_BOX_ID
+    # With ?since=<seq>, also return the transitions the caller hasn't seen yet
+    since = request.args.get('since', type=int)
+    if since is not None:
+        transitions = send_monitor_command("transitions", since=since)
+        status["transitions"] = transitions["transitions"] if transitions else []
+    return jsonify(status)
+
+@box_route('/device/monitor/start', methods=['POST'])
+def start_monitor(box_id):
+    """Start USB device monitoring, spawning the monitor process if needed"""
+    if box_id != MONITOR_BOX_ID:
+        return monitor_box_error()
     try:
-        start_device_monitor()
+        if not spawn_monitor_process(MONITOR_BOX_ID):
+            raise RuntimeError("monitor process did not come up")
+        reply = send_monitor_command("start")
+        if reply is None:
+            raise RuntimeError("monitor process is not answering")
         return jsonify({
             "status": "success",
             "message": "Device monitoring started",
-            "monitoring": device_monitor_running
+            "monitoring": reply["monitoring"]
         })
     except Exception as e:
         return jsonify({
@@ -618,15 +468,17 @@ def start_monitor():
             "message": f"Failed to start monitoring: {str(e)}"
         }), 500
 
-@app.route('/api/device/monitor/stop', methods=['POST'])
-def stop_monitor():
-    """Stop USB device monitoring"""
+@box_route('/device/monitor/stop', methods=['POST'])
+def stop_monitor(box_id):
+    """Stop USB device monitoring (the monitor process stays up, paused)"""
+    if box_id != MONITOR_BOX_ID:
+        return monitor_box_error()
     try:
-        stop_device_monitor()
+        reply = send_monitor_command("stop")
         return jsonify({
             "status": "success",
-            "message": "Device monitoring stopped",
-            "monitoring": device_monitor_running
+            "message": "Device monitoring stopped" if reply else "Device monitor is not running",
+            "monitoring": False
         })
     except Exception as e:
         return jsonify({
@@ -634,9 +486,9 @@ def stop_monitor():
             "message": f"Failed to stop monitoring: {str(e)}"
         }), 500
 
-@app.route('/api/device/scan', methods=['POST'])
-def manual_scan():
-    """Manually scan for USB devices (for testing)"""
+@box_route('/device/scan', methods=['POST'])
+def manual_scan(box_id):
+    """Manually scan the local USB bus for devices (for testing)"""
     try:
         usb_devices = get_usb_devices()
         phones = get_connected_phones()
@@ -667,23 +519,12 @@ def manual_scan():
             "message": f"Failed to scan devices: {str(e)}"
         }), 500
 
-@app.route('/api/device/stats')
-def device_stats():
+@box_route('/device/stats')
+def device_stats(box_id):
     try:
-        if not os.path.exists(DEVICE_EVENTS_FILE):
-            return jsonify({
-                "total_time": 0,
-                "sessions": [],
-                "isZenMode": False,
-                "todayZenTime": 0,
-                "zenPoints": 0,
-                "todayPoints": 0,
-                "weeklyData": [],
-                "dailyTarget": 120
-            })
-        
-        df = pd.read_csv(DEVICE_EVENTS_FILE)
-        if df.empty:
+        box = get_box(box_id)
+        data = box.get_events()
+        if not data:
             return jsonify({
                 "total_time": 0,
                 "sessions": [],
@@ -692,34 +533,42 @@ def device_stats():
                 "zenPoints": 0,
                 "todayPoints": 0,
                 "weeklyData": [],
-                "dailyTarget": 120
+                "dailyTarget": 120,
+                "full": True,
+                "sessionsOffset": 0,
+                "cursor": session_cursor([])
             })
         
         # Get user config for calculations
-        config = load_user_config()
+        config = load_user_config(box)
         daily_target = config.get("dailyTarget", 120)
         
-        # Process sessions
-        data = df.values.tolist()
-        sessions = get_sessions_from_data(data)
+        # Process sessions; totals come from the per-day rollups rather than every session
+        sessions, rollups, version = get_box_sessions(box, data)
         
         # Calculate derived values
-        total_time = sum(session["duration"] for session in sessions)
-        today_zen_time = calculate_today_zen_time(sessions)
-        zen_points = calculate_zen_points(sessions)
-        today_points = calculate_today_points(sessions)
-        weekly_data = calculate_weekly_data(sessions, daily_target)
+        total_time = calculate_total_time(rollups)
+        today_zen_time = calculate_today_zen_time(rollups)
+        zen_points = calculate_zen_points(rollups)
+        today_points = calculate_today_points(rollups)
+        weekly_data = calculate_weekly_data(rollups, daily_target)
         is_zen_mode = is_currently_in_zen_mode(sessions, data)
         
+        # With a `since` cursor only send sessions the client doesn't have yet
+        full, offset, changed_sessions = sessions_since(sessions, request.args.get('since'), version)
+        
         return jsonify({
             "total_time": total_time,
-            "sessions": sessions,
+            "sessions": changed_sessions,
             "isZenMode": is_zen_mode,
             "todayZenTime": today_zen_time,
             "zenPoints": zen_points,
             "todayPoints": today_points,
             "weeklyData": weekly_data,
-            "dailyTarget": daily_target
+            "dailyTarget": daily_target,
+            "full": full,
+            "sessionsOffset": offset,
+            "cursor": session_cursor(sessions, version)
         })
         
     except Exception as e:
@@ -735,9 +584,57 @@ def device_stats():
             "dailyTarget": 120
         }), 500
 
-@app.route('/api/user/config', methods=['GET'])
-def get_user_config():
-    config = load_user_config()
+@box_route('/device/sessions')
+def device_sessions(box_id):
+    """Sessions only, optionally as a delta after a `since` cursor"""
+    try:
+        box = get_box(box_id)
+        sessions, _, version = get_box_sessions(box, box.get_events())
+        full, offset, changed_sessions = sessions_since(sessions, request.args.get('since'), version)
+        return jsonify({
+            "sessions": changed_sessions,
+            "full": full,
+            "sessionsOffset": offset,
+            "cursor": session_cursor(sessions, version)
+        })
+    except Exception as e:
+        return jsonify({
+            "error": f"Error processing sessions: {str(e)}",
+            "sessions": []
+        }), 500
+
+@box_route('/device/heatmap')
+def device_heatmap(box_id):
+    """Zen time by hour of day and weekday over a window, with zenHours/zenDays adherence"""
+    try:
+        today = datetime.now().date()
+        end = request.args.get('end')
+        start = request.args.get('start')
+        last_day = datetime.strptime(end, "%Y-%m-%d").date() if end else today
+        first_day = datetime.strptime(start, "%Y-%m-%d").date() if start \
+            else last_day - timedelta(days=HEATMAP_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "start and end must be dates in YYYY-MM-DD format"
+        }), 400
+    if first_day > last_day or (last_day - first_day).days >= HEATMAP_MAX_DAYS:
+        return jsonify({
+            "status": "error",
+            "message": f"Window must run forwards and span at most {HEATMAP_MAX_DAYS} days"
+        }), 400
+
+    try:
+        return jsonify(build_heatmap(get_box(box_id), first_day, last_day))
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error building heatmap: {str(e)}"
+        }), 500
+
+@box_route('/user/config', methods=['GET'])
+def get_user_config(box_id):
+    config = load_user_config(get_box(box_id))
     weekly_target = calculate_weekly_target(config["dailyTarget"])
     
     return jsonify({
@@ -746,9 +643,10 @@ def get_user_config():
         "settings": config["settings"]
     })
 
-@app.route('/api/user/config', methods=['PUT'])
-def update_user_config():
+@box_route('/user/config', methods=['PUT'])
+def update_user_config(box_id):
     try:
+        box = get_box(box_id)
         new_config = request.get_json()
         if not new_config:
             return jsonify({
@@ -756,7 +654,7 @@ def update_user_config():
                 "message": "No configuration data provided"
             }), 400
             
-        current_config = load_user_config()
+        current_config = load_user_config(box)
         
         # Update configuration
         if "dailyTarget" in new_config:
@@ -776,7 +674,7 @@ def update_user_config():
                 }), 400
             current_config["settings"].update(new_config["settings"])
         
-        save_user_config(current_config)
+        save_user_config(box, current_config)
         
         return jsonify({
             "status": "success",
@@ -795,9 +693,10 @@ def update_user_config():
             "message": f"Unexpected error: {str(e)}"
         }), 500
 
-@app.route('/api/user/daily-target', methods=['PUT'])
-def update_daily_target():
+@box_route('/user/daily-target', methods=['PUT'])
+def update_daily_target(box_id):
     try:
+        box = get_box(box_id)
         data = request.get_json()
         if not data:
             return jsonify({
@@ -822,9 +721,9 @@ def update_daily_target():
         # Calculate weekly target for reference
         weekly_target = calculate_weekly_target(daily_target)
         
-        config = load_user_config()
+        config = load_user_config(box)
         config["dailyTarget"] = daily_target
-        save_user_config(config)
+        save_user_config(box, config)
         
         return jsonify({
             "status": "success",
@@ -847,20 +746,32 @@ def update_daily_target():
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_react(path):
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
+    entry = static_manifest.get(path) or static_manifest.get('index.html')
+    if entry is None:
+        return jsonify({"status": "error", "message": "Frontend build not found"}), 404
+
+    encoding = choose_encoding(entry, request.accept_encodings)
+    etag = entry['etag'] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-        return send_from_directory(app.static_folder, 'index.html')
+        response = Response(entry['variants'][encoding], content_type=entry['contentType'])
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = entry['cacheControl']
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 if __name__ == '__main__':
-    # Start USB device monitoring when running the app
-    start_device_monitor()
+    # Start USB device monitoring in its own process; under the reloader both
+    # processes ask for it, and the monitor's instance lock keeps just one
+    if not spawn_monitor_process(MONITOR_BOX_ID):
+        print("USB device monitor did not start")
     
     try:
         app.run(debug=True, host='0.0.0.0', port=8182)
     except KeyboardInterrupt:
         print("\nShutting down...")
-        stop_device_monitor()
     except Exception as e:
         print(f"Error running app: {e}")
-        stop_device_monitor()
@@ -0,0 +1,508 @@
+import os
+import io
+import csv
+import fcntl
+import itertools
+import json
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+# Legacy single-box files, still used for the default box so existing installs keep their data
+DEVICE_EVENTS_FILE = 'device_events.csv'
+USER_CONFIG_FILE = 'user_config.json'
+SESSION_HISTORY_FILE = 'session_history.json'
+# Batch event IDs that were processed but not logged (not a state transition)
+IGNORED_EVENT_IDS_FILE = 'ignored_event_ids.txt'
+# Held by processes appending to or replacing a box's events file; kept separate so
+# the events file itself can be replaced atomically
+EVENTS_LOCK_FILE = 'device_events.lock'
+
+# Every other box gets its own shard directory under BOXES_DIR
+BOXES_DIR = 'boxes'
+DEFAULT_BOX_ID = 'default'
+BOX_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+EVENT_COLUMNS = ['timestamp', 'isConnected', 'deviceName', 'deviceId', 'eventId']
+
+DEFAULT_CONFIG = {
+    "dailyTarget": 120,  # 120 minutes = 2 hours per day
+    "settings": {
+        "autoReminder": True,
+        "callFiltering": True,
+        "zenHours": "20:00-22:00",
+        "zenDays": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    }
+}
+
+# Generation numbers for loaded event histories, unique within the process so caches
+# keyed on them never mistake a reloaded or re-created shard's events for older ones
+_event_generations = itertools.count(1)
+
+def is_valid_box_id(box_id):
+    """Check that a box ID is safe to use as a shard directory name"""
+    return bool(box_id) and BOX_ID_PATTERN.match(box_id) is not None
+
+def parse_connected(value):
+    """Normalize an isConnected value read from CSV or JSON to a bool"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == "true"
+
+class BoxShard:
+    """Events, indexes and config of a single box, guarded by the box's own lock.
+
+    Events are loaded from CSV once and then kept in memory as
+    [timestamp, isConnected, deviceName, deviceId, eventId] rows; appends go to both the
+    file and the in-memory indexes so lookups never rescan the file. Rows appended by
+    other processes are picked up from the file tail on the next access.
+    """
+
+    def __init__(self, box_id, base_dir=''):
+        """base_dir is where the box's files live; the default is relative to the cwd"""
+        self.box_id = box_id
+        self.lock = threading.RLock()
+        if box_id == DEFAULT_BOX_ID:
+            self.box_dir = base_dir
+        else:
+            self.box_dir = os.path.join(base_dir, BOXES_DIR, box_id)
+        self.events_file = os.path.join(self.box_dir, DEVICE_EVENTS_FILE)
+        self.config_file = os.path.join(self.box_dir, USER_CONFIG_FILE)
+        self.history_file = os.path.join(self.box_dir, SESSION_HISTORY_FILE)
+        self.ignored_ids_file = os.path.join(self.box_dir, IGNORED_EVENT_IDS_FILE)
+        self.events_lock_file = os.path.join(self.box_dir, EVENTS_LOCK_FILE)
+        self.config = None
+        self.config_mtime = None  # mtime of the config file when it was last read or written
+        self.loaded = False
+        self.history = None
+        self.history_stamp = None  # (inode, mtime) of the loaded history file
+        self.hourly_buckets = None  # heatmap.HourlyBuckets for the current generation
+        self.ignored_ids = set()    # batch event IDs processed without being logged
+        self.ignored_ids_size = 0   # bytes of the ignored IDs file already read
+        self.append_locked = False  # whether this shard holds the events append lock
+        self._reset_events()
+
+    def _reset_events(self):
+        self.generation = next(_event_generations)  # changes whenever the events are reloaded
+        self.events = []
+        self.last_event_by_id = {}    # device_id -> event row
+        self.last_event_by_name = {}  # device_name -> event row
+        self.known_devices = {}       # device_id (or name if no ID) -> latest device_name
+        self.event_ids = set()        # client-generated IDs of batch-ingested events
+        self.file_size = 0            # bytes of the events file already indexed
+        self.file_id = None           # (device, inode) of the indexed events file
+
+    def exists(self):
+        """Whether the box has been written to; the default box always exists"""
+        return self.box_id == DEFAULT_BOX_ID or os.path.isdir(self.box_dir)
+
+    def _ensure_loaded(self, create=False):
+        """Load events and config on first access, then pick up changes made by
+        other processes (e.g. the USB monitor) since the last access. Caller holds the lock.
+
+        Until a write passes create=True, a box that doesn't exist on disk reads as
+        empty with the default config, and nothing is created for it.
+        """
+        if not self.loaded:
+            if not create and not self.exists():
+                if self.config is None:
+                    self.config = json.loads(json.dumps(DEFAULT_CONFIG))
+                return
+            if self.box_dir:
+                os.makedirs(self.box_dir, exist_ok=True)
+            self._load_events()
+            self._sync_ignored_ids()
+            self.config = self._load_config()
+            self.loaded = True
+            return
+
+        self._sync_events()
+        self._sync_ignored_ids()
+        try:
+            config_mtime = os.stat(self.config_file).st_mtime_ns
+        except FileNotFoundError:
+            config_mtime = None
+        if config_mtime != self.config_mtime:
+            self.config = self._load_config()
+
+    @contextmanager
+    def _events_append_lock(self):
+        """Hold the cross-process lock for appending to or replacing the events file.
+
+        Re-entrant within the shard (callers hold self.lock), so a reload while
+        appending reuses the held lock instead of deadlocking on a second flock.
+        """
+        if self.append_locked:
+            yield
+            return
+        with open(self.events_lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.append_locked = True
+            try:
+                yield
+            finally:
+                self.append_locked = False
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _replace_events_file(self, content):
+        """Atomically replace the events file; caller holds the append lock"""
+        temp_file = f"{self.events_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.events_file)
+
+    def _load_events(self):
+        self._reset_events()
+        with self._events_append_lock():
+            try:
+                with open(self.events_file, 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                content = b''
+            if not content:
+                content = (','.join(EVENT_COLUMNS) + '\n').encode('utf-8')
+                with open(self.events_file, 'ab') as f:
+                    f.write(content)
+            elif not content.endswith(b'\n'):
+                # Appends hold the lock, so a last row without a newline was written
+                # unterminated (e.g. by hand); terminate it so later appends start on a new line
+                with open(self.events_file, 'ab') as f:
+                    f.write(b'\n')
+                content += b'\n'
+
+            df = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False)
+            # Add columns missing from older files for backward compatibility; the file is
+            # replaced under the lock so no append is lost and no reader sees it half-written
+            missing = [column for column in EVENT_COLUMNS if column not in df.columns]
+            for column in missing:
+                df[column] = ''
+            if missing:
+                content = df[EVENT_COLUMNS].to_csv(index=False).encode('utf-8')
+                self._replace_events_file(content)
+            stat = os.stat(self.events_file)
+            self.file_size = len(content)
+            self.file_id = (stat.st_dev, stat.st_ino)
+        for row in df[EVENT_COLUMNS].itertuples(index=False):
+            self._index_event([row[0], parse_connected(row[1]), row[2], row[3], row[4]])
+
+    def _sync_events(self):
+        """Index rows other processes appended to the events file since we last read it"""
+        try:
+            f = open(self.events_file, 'rb')
+        except FileNotFoundError:
+            if self.file_size:
+                self._load_events()
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_dev, stat.st_ino) != self.file_id or stat.st_size < self.file_size:
+                # File was replaced, rewritten or truncated; indexes no longer describe it
+                self._load_events()
+                return
+            if stat.st_size == self.file_size:
+                return
+            f.seek(self.file_size)
+            content = f.read(stat.st_size - self.file_size)
+        content = content[:content.rfind(b'\n') + 1]
+        self.file_size += len(content)
+        for row in csv.reader(io.StringIO(content.decode('utf-8'))):
+            if len(row) < len(EVENT_COLUMNS):
+                row += [''] * (len(EVENT_COLUMNS) - len(row))
+            self._index_event([row[0], parse_connected(row[1]), row[2], row[3], row[4]])
+
+    def _sync_ignored_ids(self):
+        """Read ignored batch event IDs recorded since we last looked, by any process"""
+        try:
+            size = os.path.getsize(self.ignored_ids_file)
+        except FileNotFoundError:
+            return
+        if size <= self.ignored_ids_size:
+            return
+        with open(self.ignored_ids_file, 'rb') as f:
+            f.seek(self.ignored_ids_size)
+            content = f.read(size - self.ignored_ids_size)
+        content = content[:content.rfind(b'\n') + 1]
+        self.ignored_ids_size += len(content)
+        self.ignored_ids.update(line for line in content.decode('utf-8').splitlines() if line)
+
+    def _index_event(self, event):
+        self.events.append(event)
+        device_name, device_id, event_id = event[2], event[3], event[4]
+        if event_id:
+            self.event_ids.add(event_id)
+        if device_id:
+            self.last_event_by_id[device_id] = event
+            self.known_devices[device_id] = device_name
+        elif device_name:
+            self.known_devices[device_name] = device_name
+        if device_name:
+            self.last_event_by_name[device_name] = event
+
+    def _load_config(self):
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = json.loads(json.dumps(DEFAULT_CONFIG))
+            self._write_config(config)
+            return config
+        except json.JSONDecodeError as e:
+            # Never overwrite a file we can't parse; keep the last good config and retry next time
+            print(f"Error reading config for box {self.box_id}, keeping last good config: {e}")
+            if self.config is not None:
+                return self.config
+            return json.loads(json.dumps(DEFAULT_CONFIG))
+        self.config_mtime = os.stat(self.config_file).st_mtime_ns
+
+        # Migrate old config format (weeklyTarget) to dailyTarget if needed
+        if "weeklyTarget" in config and "dailyTarget" not in config:
+            config["dailyTarget"] = config["weeklyTarget"] // 7
+            del config["weeklyTarget"]
+            self._write_config(config)
+            print(f"Migrated config for box {self.box_id} from weeklyTarget to dailyTarget")
+        if "dailyTarget" not in config:
+            config["dailyTarget"] = DEFAULT_CONFIG["dailyTarget"]
+            self._write_config(config)
+        return config
+
+    def _write_config(self, config):
+        """Atomically replace the config file so other processes never read it half-written"""
+        temp_file = f"{self.config_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.config_file)
+        self.config_mtime = os.stat(self.config_file).st_mtime_ns
+
+    def refresh(self):
+        """Pick up events and config other processes wrote; callers reading
+        self.events directly hold the lock and call this first"""
+        with self.lock:
+            self._ensure_loaded()
+
+    def get_events(self):
+        """Return a snapshot of all event rows in chronological order"""
+        with self.lock:
+            self._ensure_loaded()
+            return list(self.events)
+
+    def get_last_event(self):
+        """Get the box's last stored event, whichever device it was for"""
+        with self.lock:
+            self._ensure_loaded()
+            if not self.events:
+                return None
+            event = self.events[-1]
+            return {
+                'timestamp': event[0],
+                'isConnected': event[1],
+                'deviceName': event[2],
+                'deviceId': event[3]
+            }
+
+    def get_last_device_event(self, device_id, device_name=""):
+        """Get the last event for a device by ID, fallback to name if ID is empty"""
+        with self.lock:
+            self._ensure_loaded()
+            event = None
+            if device_id:
+                event = self.last_event_by_id.get(device_id)
+            if event is None and device_name:
+                event = self.last_event_by_name.get(device_name)
+            if event is None:
+                return None
+            return {
+                'timestamp': event[0],
+                'isConnected': event[1],
+                'deviceName': event[2],
+                'deviceId': event[3]
+            }
+
+    def get_known_devices(self):
+        """Get all devices that have been seen before in this box"""
+        with self.lock:
+            self._ensure_loaded()
+            return dict(self.known_devices)
+
+    def has_event_id(self, event_id):
+        """Check whether a batch event ID was already processed, logged or ignored"""
+        with self.lock:
+            self._ensure_loaded()
+            return event_id in self.event_ids or event_id in self.ignored_ids
+
+    def _append_ignored_ids(self, event_ids):
+        """Remember batch event IDs that were processed without being logged"""
+        if not event_ids:
+            return
+        with open(self.ignored_ids_file, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._sync_ignored_ids()
+                f.write(''.join(f"{event_id}\n" for event_id in event_ids))
+                f.flush()
+                self.ignored_ids_size = os.fstat(f.fileno()).st_size
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        self.ignored_ids.update(event_ids)
+
+    def append_event(self, is_connected, device_name="", device_id="", timestamp=None, event_id=""):
+        """Append an event to the box's CSV file and in-memory indexes"""
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.append_events([[timestamp, bool(is_connected), device_name, device_id, event_id]])
+
+    def append_events(self, events):
+        """Append event rows to the box's CSV file in a single write, then index them"""
+        if events:
+            self.ingest_events(lambda: (events, []))
+
+    def ingest_events(self, select):
+        """Append the event rows select() picks, picking them under the cross-process lock.
+
+        select() runs once the indexes hold every event and ignored ID that other
+        processes recorded, so checks against the box's state can't race another
+        writer. It returns (event rows to append, batch event IDs to remember as
+        ignored), which are also returned.
+        """
+        with self.lock:
+            self._ensure_loaded(create=True)
+            # Serialize appends with other processes writing to this box
+            with self._events_append_lock():
+                self._sync_events()
+                self._sync_ignored_ids()
+                events, ignored_ids = select()
+                if events:
+                    with open(self.events_file, 'a', newline='', encoding='utf-8') as f:
+                        writer = csv.writer(f, lineterminator='\n')
+                        for e in events:
+                            writer.writerow([e[0], str(e[1]), e[2], e[3], e[4]])
+                        f.flush()
+                        self.file_size = os.fstat(f.fileno()).st_size
+                    for event in events:
+                        self._index_event(list(event))
+                self._append_ignored_ids(ignored_ids)
+        return events, ignored_ids
+
+    def get_session_history(self):
+        """Get the recomputed session history snapshot, reloading it when the file is replaced"""
+        with self.lock:
+            try:
+                stat = os.stat(self.history_file)
+            except FileNotFoundError:
+                self.history, self.history_stamp = None, None
+                return None
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+            if stamp != self.history_stamp:
+                try:
+                    with open(self.history_file, 'r', encoding='utf-8') as f:
+                        self.history = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Error loading session history for box {self.box_id}: {e}")
+                    self.history = None
+                self.history_stamp = stamp
+            return self.history
+
+    def save_session_history(self, history):
+        """Atomically replace the session history snapshot so readers switch over at once"""
+        directory = os.path.dirname(self.history_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        temp_file = f"{self.history_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(history, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.history_file)
+
+    def load_config(self):
+        with self.lock:
+            self._ensure_loaded()
+            return json.loads(json.dumps(self.config))
+
+    def save_config(self, config):
+        with self.lock:
+            self._ensure_loaded(create=True)
+            self._write_config(config)
+            self.config = json.loads(json.dumps(config))
+
+def get_last_device_event(box, device_id, device_name=""):
+    """Get the last event for a device by ID, fallback to name if ID is empty"""
+    try:
+        return box.get_last_device_event(device_id, device_name)
+    except Exception as e:
+        print(f"Error getting last device event: {e}")
+        return None
+
+def should_log_connection(box, device_id, device_name):
+    """Check if we should log a connection event (avoid duplicates)"""
+    last_event = get_last_device_event(box, device_id, device_name)
+    
+    # If no previous event, log the connection
+    if not last_event:
+        return True
+    
+    # If last event was disconnection, log the connection
+    if not last_event['isConnected']:
+        return True
+    
+    # If last event was connection, don't log duplicate
+    return False
+
+def should_log_disconnection(box, device_id, device_name):
+    """Check if we should log a disconnection event"""
+    last_event = get_last_device_event(box, device_id, device_name)
+    
+    # If no previous event, don't log disconnection (nothing was connected)
+    if not last_event:
+        return False
+    
+    # If last event was connection, log the disconnection
+    if last_event['isConnected']:
+        return True
+    
+    # If last event was disconnection, don't log duplicate
+    return False
+
+def log_device_event(box, is_connected, device_name="", device_id="", timestamp=None):
+    try:
+        box.append_event(is_connected, device_name, device_id, timestamp)
+    except Exception as e:
+        print(f"Error logging device event: {e}")
+        raise
+
+def get_all_known_devices(box):
+    """Get all devices that have been seen before in the box's events"""
+    try:
+        return box.get_known_devices()
+    except Exception as e:
+        print(f"Error getting known devices: {e}")
+        return {}
+
+# Shards kept in memory per process; the least recently used beyond this are dropped
+# and reloaded from their files on next use. A request still holding a dropped shard
+# stays consistent with the new one the same way separate processes do, via the files.
+MAX_CACHED_BOXES = int(os.environ.get('ZENBOX_MAX_CACHED_BOXES', '1024'))
+
+_shards = OrderedDict()
+_shards_lock = threading.Lock()
+
+def get_box(box_id=DEFAULT_BOX_ID):
+    """Get the in-memory shard for a box, creating it on first use (the box's files are
+    only created by its first write)"""
+    if not is_valid_box_id(box_id):
+        raise ValueError(f"Invalid box ID: {box_id!r}")
+    with _shards_lock:
+        shard = _shards.get(box_id)
+        if shard is None:
+            shard = BoxShard(box_id)
+            _shards[box_id] = shard
+            while len(_shards) > MAX_CACHED_BOXES:
+                _shards.popitem(last=False)
+        else:
+            _shards.move_to_end(box_id)
+    return shard
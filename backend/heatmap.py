@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+from box_store import parse_connected
+from sessions import parse_event_time
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# A scheduled zen day counts as met when this share of its zen hours was spent in zen mode
+ZEN_HOURS_MET_RATIO = 0.8
+
+# Number of recently requested heatmap windows kept per process
+HEATMAP_CACHE_SIZE = 256
+
+def split_into_hours(start, end):
+    """Yield (hour_start, seconds) for each clock hour that [start, end) overlaps"""
+    current = start
+    while current < end:
+        hour_start = current.replace(minute=0, second=0, microsecond=0)
+        next_hour = hour_start + timedelta(hours=1)
+        segment_end = min(next_hour, end)
+        yield hour_start, (segment_end - current).total_seconds()
+        current = segment_end
+
+class HourlyBuckets:
+    """Zen seconds per clock hour, advanced incrementally over a box's appended events"""
+
+    def __init__(self, generation):
+        self.generation = generation  # BoxShard.generation of the events being folded in
+        self.processed = 0      # number of events already folded into the buckets
+        self.open_start = None  # start of the session still open after the processed events
+        self.seconds = {}       # hour start datetime -> zen seconds from completed sessions
+
+    def advance(self, new_events):
+        """Fold in the events appended after the ones already processed"""
+        for entry in new_events:
+            parsed_time = parse_event_time(entry[0])
+            if parsed_time is None:
+                continue
+            entry_connected = parse_connected(entry[1])
+            if entry_connected and self.open_start is None:
+                self.open_start = parsed_time
+            elif not entry_connected and self.open_start is not None:
+                for hour_start, seconds in split_into_hours(self.open_start, parsed_time):
+                    self.seconds[hour_start] = self.seconds.get(hour_start, 0) + seconds
+                self.open_start = None
+        self.processed += len(new_events)
+
+def parse_zen_hours(zen_hours):
+    """Parse a 'HH:MM-HH:MM' setting into minute offsets; the end may fall after midnight"""
+    try:
+        start_text, end_text = zen_hours.split('-')
+        start = datetime.strptime(start_text.strip(), "%H:%M")
+        end = datetime.strptime(end_text.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        return None
+    start_minutes = start.hour * 60 + start.minute
+    end_minutes = end.hour * 60 + end.minute
+    if end_minutes <= start_minutes:
+        end_minutes += 24 * 60
+    return start_minutes, end_minutes
+
+def overlap_seconds(hour_seconds, window_start, window_end):
+    """Zen seconds of the hourly buckets credited to [window_start, window_end).
+
+    Buckets only know the total per hour, so partially covered hours are
+    credited proportionally.
+    """
+    total = 0
+    for hour_start, seconds in split_into_hours(window_start, window_end):
+        total += hour_seconds.get(hour_start, 0) * seconds / 3600
+    return total
+
+def aggregate_window(hour_seconds, first_day, last_day, zen_hours, zen_days):
+    """Build heatmap totals for the days first_day..last_day (inclusive) from hourly buckets"""
+    window_start = datetime.combine(first_day, datetime.min.time())
+    window_end = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+
+    grid = [[0.0] * 24 for _ in WEEKDAYS]
+    for hour_start, seconds in hour_seconds.items():
+        if window_start <= hour_start < window_end:
+            grid[hour_start.weekday()][hour_start.hour] += seconds
+
+    schedule = None
+    zen_window = parse_zen_hours(zen_hours)
+    if zen_window is not None:
+        days = []
+        day = first_day
+        while day <= last_day:
+            if WEEKDAYS[day.weekday()] in zen_days:
+                midnight = datetime.combine(day, datetime.min.time())
+                slot_start = midnight + timedelta(minutes=zen_window[0])
+                slot_end = midnight + timedelta(minutes=zen_window[1])
+                days.append({
+                    "date": day.isoformat(),
+                    "day": WEEKDAYS[day.weekday()],
+                    "slotStart": slot_start,
+                    "slotEnd": slot_end,
+                    "zenSeconds": overlap_seconds(hour_seconds, slot_start, slot_end),
+                    "slotSeconds": (slot_end - slot_start).total_seconds()
+                })
+            day += timedelta(days=1)
+        schedule = {"zenHours": zen_hours, "zenDays": list(zen_days), "days": days}
+
+    return {"grid": grid, "schedule": schedule}
+
+class HeatmapCache:
+    """LRU cache of aggregated windows, keyed so that new events invalidate entries"""
+
+    def __init__(self, maxsize=HEATMAP_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+heatmap_cache = HeatmapCache()
+
+def build_heatmap(box, first_day, last_day, now=None):
+    """Heatmap of zen time by weekday and hour for a box over first_day..last_day"""
+    now = now or datetime.now()
+    config = box.load_config()
+    settings = config.get("settings", {})
+    zen_hours = settings.get("zenHours", "")
+    zen_days = tuple(settings.get("zenDays", []))
+
+    with box.lock:
+        box.refresh()
+        buckets = box.hourly_buckets
+        if buckets is None or buckets.generation != box.generation:
+            # First request, or the events file was rewritten and reloaded
+            buckets = box.hourly_buckets = HourlyBuckets(box.generation)
+        # Only the tail is read; copying every event per request would dominate
+        buckets.advance(box.events[buckets.processed:])
+
+        # The generation tells reloaded histories apart even at equal event counts
+        key = (box.box_id, box.generation, first_day, last_day, buckets.processed, zen_hours, zen_days)
+        totals = heatmap_cache.get(key)
+        if totals is None:
+            totals = aggregate_window(buckets.seconds, first_day, last_day, zen_hours, zen_days)
+            heatmap_cache.put(key, totals)
+        open_start = buckets.open_start
+
+    # The active session changes every second, so it is added on top of the cached totals
+    hour_seconds = {}
+    if open_start is not None:
+        hour_seconds = dict(split_into_hours(open_start, now))
+    window_start = datetime.combine(first_day, datetime.min.time())
+    window_end = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+
+    grid = [list(row) for row in totals["grid"]]
+    for hour_start, seconds in hour_seconds.items():
+        if window_start <= hour_start < window_end:
+            grid[hour_start.weekday()][hour_start.hour] += seconds
+
+    by_hour = [sum(row[hour] for row in grid) for hour in range(24)]
+    result = {
+        "start": first_day.isoformat(),
+        "end": last_day.isoformat(),
+        "grid": [[round(seconds / 60, 1) for seconds in row] for row in grid],
+        "byHour": [round(seconds / 60, 1) for seconds in by_hour],
+        "byWeekday": [{"day": WEEKDAYS[i], "zen": round(sum(row) / 60, 1)} for i, row in enumerate(grid)],
+        "zenSchedule": None
+    }
+
+    schedule = totals["schedule"]
+    if schedule is not None:
+        days = []
+        total_zen = 0
+        for day in schedule["days"]:
+            zen_seconds = day["zenSeconds"]
+            if hour_seconds:
+                zen_seconds += overlap_seconds(hour_seconds, day["slotStart"], day["slotEnd"])
+            total_zen += zen_seconds
+            coverage = zen_seconds / day["slotSeconds"] if day["slotSeconds"] else 0
+            days.append({
+                "date": day["date"],
+                "day": day["day"],
+                "zen": round(zen_seconds / 60, 1),
+                "target": round(day["slotSeconds"] / 60, 1),
+                "coverage": round(coverage, 3),
+                "met": coverage >= ZEN_HOURS_MET_RATIO
+            })
+        total_target = sum(day["slotSeconds"] for day in schedule["days"])
+        result["zenSchedule"] = {
+            "zenHours": schedule["zenHours"],
+            "zenDays": schedule["zenDays"],
+            "scheduledDays": len(days),
+            "daysMet": sum(1 for day in days if day["met"]),
+            "coverage": round(total_zen / total_target, 3) if total_target else 0,
+            "days": days
+        }
+    return result
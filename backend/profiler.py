@@ -0,0 +1,45 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Seconds between stack samples; nothing runs between profiling requests
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 60
+
+# Only one sampler at a time per process, so overlapping requests can't skew each other
+profile_lock = threading.Lock()
+
+def format_frame(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds, interval=PROFILE_SAMPLE_INTERVAL, exclude_thread_ids=()):
+    """Sample every thread's stack for `seconds`; returns (collapsed stack counts, sample rounds).
+
+    Stacks are root-first and ';'-joined with the thread name as the root frame,
+    the collapsed format flamegraph.pl and speedscope read.
+    """
+    excluded = set(exclude_thread_ids) | {threading.get_ident()}
+    counts = Counter()
+    rounds = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in excluded:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(format_frame(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(stack))] += 1
+        rounds += 1
+        time.sleep(interval)
+    return counts, rounds
+
+def format_collapsed(counts):
+    """One 'frame;frame;frame count' line per stack, most sampled first"""
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
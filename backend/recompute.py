@@ -0,0 +1,146 @@
+"""Offline recompute of a box's sessions and daily rollups from its full event history.
+
+Splits the history into periods, pairs sessions for each period in a process
+pool, stitches sessions that cross period boundaries and atomically replaces
+the box's session history snapshot, which the API picks up on its next read.
+
+    python backend/recompute.py --box default --period month --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from box_store import DEFAULT_BOX_ID, get_box, parse_connected
+from sessions import pair_sessions, parse_event_time, add_to_daily_rollups, event_fingerprint
+
+# Timestamp prefix length that identifies each period ("2025-07-06 14:20:45")
+PERIOD_KEY_LENGTHS = {
+    'day': 10,
+    'month': 7,
+    'year': 4,
+}
+
+def partition_events(data, period):
+    """Split events into contiguous runs that share a period, keeping file order"""
+    key_length = PERIOD_KEY_LENGTHS[period]
+    partitions = []
+    current_key = None
+    for event in data:
+        key = str(event[0])[:key_length]
+        if key != current_key:
+            partitions.append([])
+            current_key = key
+        partitions[-1].append(event)
+    return partitions
+
+def compute_partition(events):
+    """Pair sessions for one partition assuming it starts disconnected.
+
+    Also returns the first disconnect time, which is where a session carried
+    in from the previous partition would end instead.
+    """
+    sessions, open_start = pair_sessions(events)
+    first_disconnect = None
+    for event in events:
+        if not parse_connected(event[1]):
+            first_disconnect = parse_event_time(event[0])
+            if first_disconnect is not None:
+                break
+    rollups = {}
+    for session in sessions:
+        add_to_daily_rollups(rollups, session)
+    return {
+        "sessions": sessions,
+        "openStart": open_start,
+        "firstDisconnect": first_disconnect,
+        "rollups": rollups,
+    }
+
+def stitch_partitions(partials):
+    """Combine partition results in order, carrying open sessions across boundaries"""
+    sessions = []
+    rollups = {}
+    carried_start = None
+    for partial in partials:
+        partition_sessions = partial["sessions"]
+        partition_rollups = {day: dict(rollup) for day, rollup in partial["rollups"].items()}
+        open_start = partial["openStart"]
+
+        if carried_start is not None:
+            first_disconnect = partial["firstDisconnect"]
+            if first_disconnect is None:
+                # Still connected throughout; this partition's own pairing does not apply
+                partition_sessions = []
+                partition_rollups = {}
+                open_start = carried_start
+            else:
+                # The carried session ends at the first disconnect, replacing any
+                # session this partition paired up to that point
+                kept = []
+                for session in partition_sessions:
+                    if datetime.fromisoformat(session["end"]) <= first_disconnect:
+                        add_to_daily_rollups(partition_rollups, session, sign=-1)
+                    else:
+                        kept.append(session)
+                stitched = {
+                    "start": carried_start.isoformat(),
+                    "end": first_disconnect.isoformat(),
+                    "duration": (first_disconnect - carried_start).total_seconds()
+                }
+                add_to_daily_rollups(partition_rollups, stitched)
+                partition_sessions = [stitched] + kept
+
+        sessions.extend(partition_sessions)
+        for day, rollup in partition_rollups.items():
+            total = rollups.setdefault(day, {"seconds": 0, "sessions": 0})
+            total["seconds"] += rollup["seconds"]
+            total["sessions"] += rollup["sessions"]
+        carried_start = open_start
+    return sessions, rollups, carried_start
+
+def recompute_box(box_id=DEFAULT_BOX_ID, period='month', workers=None):
+    """Recompute and atomically publish a box's session history; returns the snapshot"""
+    box = get_box(box_id)
+    data = box.get_events()
+    partitions = partition_events(data, period)
+
+    if len(partitions) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(compute_partition, partitions))
+    else:
+        partials = [compute_partition(events) for events in partitions]
+
+    sessions, rollups, open_start = stitch_partitions(partials)
+    history = {
+        "version": 1,
+        "boxId": box_id,
+        "generatedAt": datetime.now().isoformat(),
+        "period": period,
+        "partitions": len(partitions),
+        "eventCount": len(data),
+        "lastEvent": event_fingerprint(data[-1]) if data else None,
+        "sessions": sessions,
+        "openSessionStart": open_start.isoformat() if open_start else None,
+        "dailyRollups": dict(sorted(rollups.items())),
+    }
+    box.save_session_history(history)
+    return history
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--box', default=DEFAULT_BOX_ID, help='Box ID to recompute')
+    parser.add_argument('--period', choices=sorted(PERIOD_KEY_LENGTHS), default='month',
+                        help='History partition size')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes (1 computes in-process)')
+    args = parser.parse_args()
+
+    started = time.time()
+    history = recompute_box(args.box, args.period, args.workers)
+    print(f"Recomputed box {args.box}: {history['eventCount']} events, "
+          f"{history['partitions']} partitions, {len(history['sessions'])} sessions "
+          f"in {time.time() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+from datetime import datetime
+from box_store import parse_connected
+
+# Event timestamp formats written to the CSV, in local time
+EVENT_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+def parse_event_time(value):
+    """Parse an event timestamp, with or without seconds; None if invalid.
+
+    ISO 8601 'T' timestamps as batch agents send them (fractional seconds, a
+    UTC offset or 'Z') are accepted too; aware times are converted to naive
+    local time like the stored rows.
+    """
+    for fmt in EVENT_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    if not isinstance(value, str) or 'T' not in value:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def pair_sessions(data, open_start=None):
+    """Pair connect/disconnect events into completed sessions.
+
+    open_start is the start time of a session still open before the first
+    event (None when disconnected). Returns the completed sessions and the
+    start time of the session still open after the last event, if any.
+    """
+    sessions = []
+    for entry in data:
+        entry_connected = parse_connected(entry[1])
+        parsed_time = parse_event_time(entry[0])
+        if parsed_time is None:
+            continue  # Skip invalid timestamps
+
+        if entry_connected and open_start is None:
+            open_start = parsed_time
+        elif not entry_connected and open_start is not None:
+            sessions.append({
+                "start": open_start.isoformat(),
+                "end": parsed_time.isoformat(),
+                "duration": (parsed_time - open_start).total_seconds()
+            })
+            open_start = None
+    return sessions, open_start
+
+def active_session(open_start, now=None):
+    """Build the ongoing session for a connection that has not ended yet"""
+    current_time = now or datetime.now()
+    return {
+        "start": open_start.isoformat(),
+        "end": current_time.isoformat(),
+        "duration": (current_time - open_start).total_seconds(),
+        "isActive": True  # Mark as currently active session
+    }
+
+def add_to_daily_rollups(rollups, session, sign=1):
+    """Add (or with sign=-1 remove) a session's duration to its start day's rollup"""
+    day = session["start"][:10]
+    rollup = rollups.setdefault(day, {"seconds": 0, "sessions": 0})
+    rollup["seconds"] += sign * session["duration"]
+    rollup["sessions"] += sign
+    if rollup["sessions"] == 0:
+        del rollups[day]
+
+def event_fingerprint(event):
+    """Identify an event row well enough to detect a rewritten events file"""
+    return [event[0], parse_connected(event[1]), event[2], event[3], event[4]]
+
+def history_matches_events(history, data):
+    """Check that a session history snapshot covers a prefix of these events"""
+    if not history:
+        return False
+    event_count = history.get("eventCount", 0)
+    if event_count > len(data):
+        return False
+    if event_count == 0:
+        return True
+    return history.get("lastEvent") == event_fingerprint(data[event_count - 1])
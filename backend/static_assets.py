@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+# Filenames with a content hash (bundle.3f2a9c1d.js) never change, so they can be cached forever
+HASHED_ASSET_PATTERN = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Text assets worth gzipping in memory when the build ships no .gz variant
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 1024
+
+# Pre-compressed variants looked for next to each file, in order of preference
+ENCODING_SUFFIXES = [('br', '.br'), ('gzip', '.gz')]
+
+def build_static_manifest(root):
+    """Read the frontend build into memory: url path -> asset entry with encoded variants"""
+    manifest = {}
+    if not os.path.isdir(root):
+        print(f"Frontend build not found at {root}")
+        return manifest
+
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')):
+                continue  # Picked up as variants of the file they compress
+            full_path = os.path.join(directory, filename)
+            url_path = os.path.relpath(full_path, root).replace(os.sep, '/')
+            with open(full_path, 'rb') as f:
+                body = f.read()
+
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type == 'application/javascript':
+                content_type += '; charset=utf-8'
+
+            variants = {'identity': body}
+            for encoding, suffix in ENCODING_SUFFIXES:
+                if os.path.exists(full_path + suffix):
+                    with open(full_path + suffix, 'rb') as f:
+                        variants[encoding] = f.read()
+            if 'gzip' not in variants and len(body) >= MIN_COMPRESS_BYTES \
+                    and content_type.startswith(COMPRESSIBLE_TYPES):
+                variants['gzip'] = gzip.compress(body, compresslevel=9)
+
+            manifest[url_path] = {
+                'variants': variants,
+                'contentType': content_type,
+                'etag': hashlib.sha1(body).hexdigest()[:16],
+                'cacheControl': IMMUTABLE_CACHE_CONTROL if HASHED_ASSET_PATTERN.search(filename)
+                                else REVALIDATE_CACHE_CONTROL
+            }
+    print(f"Loaded {len(manifest)} frontend assets from {root}")
+    return manifest
+
+def choose_encoding(entry, accept_encodings):
+    """Pick the preferred pre-compressed variant the client accepts, else identity"""
+    for encoding, _ in ENCODING_SUFFIXES:
+        if encoding in entry['variants'] and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
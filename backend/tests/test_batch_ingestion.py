@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import box_store
+from app import app
+
+BATCH = {"events": [
+    {"id": "e1", "timestamp": "2025-03-03 10:00:00", "isConnected": True, "deviceName": "Phone", "deviceId": "05ac:12a8"},
+    {"id": "e2", "timestamp": "2025-03-03 10:10:00", "isConnected": True, "deviceName": "Phone", "deviceId": "05ac:12a8"},
+    {"id": "e3", "timestamp": "2025-03-03 10:30:00", "isConnected": False, "deviceName": "Phone", "deviceId": "05ac:12a8"},
+]}
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box_store._shards.clear()
+    yield app.test_client()
+    box_store._shards.clear()
+
+def test_retried_batch_accepts_nothing_new(client):
+    first = client.post('/api/device/events/batch', json=BATCH).get_json()
+    assert first["accepted"] == ["e1", "e3"]
+    assert first["ignored"] == ["e2"]
+
+    second = client.post('/api/device/events/batch', json=BATCH).get_json()
+    assert second["accepted"] == []
+    assert sorted(second["duplicates"]) == ["e1", "e2", "e3"]
+
+    rows = box_store.get_box().get_events()
+    assert [row[4] for row in rows] == ["e1", "e3"]
+
+def test_ignored_ids_survive_a_new_process(client):
+    client.post('/api/device/events/batch', json=BATCH)
+    box_store._shards.clear()
+
+    retry = client.post('/api/device/events/batch', json=BATCH).get_json()
+    assert retry["accepted"] == []
+    assert sorted(retry["duplicates"]) == ["e1", "e2", "e3"]
+
+def test_event_older_than_last_stored_event_is_rejected(client):
+    client.post('/api/device/events/batch', json=BATCH)
+    late = {"events": [{"id": "e4", "timestamp": "2025-03-03 10:20:00", "isConnected": True,
+                        "deviceName": "Phone", "deviceId": "05ac:12a8"}]}
+
+    result = client.post('/api/device/events/batch', json=late).get_json()
+    assert result["accepted"] == []
+    assert [entry["id"] for entry in result["rejected"]] == ["e4"]
+
+def test_event_older_than_another_devices_last_event_is_rejected(client):
+    phone_a = {"events": [{"id": "a1", "timestamp": "2025-03-03 12:00:00", "isConnected": True,
+                           "deviceName": "Phone A", "deviceId": "05ac:12a8"}]}
+    phone_b = {"events": [
+        {"id": "b1", "timestamp": "2025-03-03 10:00:00", "isConnected": True, "deviceName": "Phone B", "deviceId": "18d1:4ee7"},
+        {"id": "b2", "timestamp": "2025-03-03 10:30:00", "isConnected": False, "deviceName": "Phone B", "deviceId": "18d1:4ee7"},
+    ]}
+    client.post('/api/device/events/batch', json=phone_a)
+
+    result = client.post('/api/device/events/batch', json=phone_b).get_json()
+    assert result["accepted"] == []
+    assert [entry["id"] for entry in result["rejected"]] == ["b1", "b2"]
+
+    sessions = client.get('/api/device/sessions').get_json()["sessions"]
+    assert all(session["duration"] >= 0 for session in sessions)
+
+def post_batch_in_fresh_process(batch):
+    box_store._shards.clear()
+    return app.test_client().post('/api/device/events/batch', json=batch).get_json()["accepted"]
+
+def test_concurrent_retries_from_several_processes_accept_each_event_once(client):
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        results = pool.map(post_batch_in_fresh_process, [BATCH] * 8)
+
+    assert sorted(event_id for accepted in results for event_id in accepted) == ["e1", "e3"]
+    assert [row[4] for row in box_store.get_box().get_events()] == ["e1", "e3"]
+
+def test_iso_timestamps_with_offset_or_fraction_are_accepted(client):
+    batch = {"events": [
+        {"id": "z1", "timestamp": "2025-03-03T10:00:00.250000", "isConnected": True, "deviceId": "05ac:12a8"},
+        {"id": "z2", "timestamp": "2025-03-03T10:30:00Z", "isConnected": False, "deviceId": "05ac:12a8"},
+    ]}
+
+    result = client.post('/api/device/events/batch', json=batch).get_json()
+    assert result["accepted"] == ["z1", "z2"]
+    assert result["rejected"] == []
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import box_store
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box_store._shards.clear()
+    yield box_store.get_box()
+    box_store._shards.clear()
+
+def test_unreadable_config_keeps_last_good_config(box):
+    config = box.load_config()
+    config["dailyTarget"] = 45
+    box.save_config(config)
+
+    with open(box_store.USER_CONFIG_FILE, 'w', encoding='utf-8') as f:
+        f.write('{"dailyTar')
+    os.utime(box_store.USER_CONFIG_FILE, ns=(0, 0))
+
+    assert box.load_config()["dailyTarget"] == 45
+    with open(box_store.USER_CONFIG_FILE, encoding='utf-8') as f:
+        assert f.read() == '{"dailyTar'
+
+def test_unterminated_last_row_is_kept_and_terminated(box):
+    with open(box_store.DEVICE_EVENTS_FILE, 'w', encoding='utf-8') as f:
+        f.write("timestamp,isConnected\n2025-07-12 10:30,true\n2025-07-12 10:45,false")
+
+    assert [row[:2] for row in box.get_events()] == [["2025-07-12 10:30", True], ["2025-07-12 10:45", False]]
+
+    box.append_event(True, timestamp="2025-07-12 11:00:00")
+    box_store._shards.clear()
+    rows = box_store.get_box().get_events()
+    assert [row[:2] for row in rows] == [["2025-07-12 10:30", True], ["2025-07-12 10:45", False],
+                                         ["2025-07-12 11:00:00", True]]
+
+def test_reading_an_unknown_box_creates_nothing(tmp_path, box):
+    unknown = box_store.get_box('newbox123')
+    assert unknown.get_events() == []
+    assert unknown.get_last_device_event('05ac:12a8') is None
+    assert unknown.load_config()["dailyTarget"] == box_store.DEFAULT_CONFIG["dailyTarget"]
+    assert not (tmp_path / box_store.BOXES_DIR).exists()
+
+    unknown.append_event(True, timestamp="2025-07-12 10:30:00")
+    assert len(box_store.get_box('newbox123').get_events()) == 1
+    assert (tmp_path / box_store.BOXES_DIR / 'newbox123' / box_store.DEVICE_EVENTS_FILE).exists()
+
+def test_least_recently_used_boxes_are_evicted(box, monkeypatch):
+    monkeypatch.setattr(box_store, 'MAX_CACHED_BOXES', 2)
+    first = box_store.get_box('first')
+    first.append_event(True, timestamp="2025-07-12 10:30:00")
+    box_store.get_box('second')
+    box_store.get_box('first')
+    box_store.get_box('third')
+
+    assert list(box_store._shards) == ['first', 'third']
+    assert box_store.get_box('second').get_events() == []
+    assert len(box_store.get_box('first').get_events()) == 1
+
+def test_legacy_columns_are_migrated_by_replacing_the_file(box):
+    with open(box_store.DEVICE_EVENTS_FILE, 'w', encoding='utf-8') as f:
+        f.write("timestamp,isConnected\n2025-07-12 10:30,true\n")
+    legacy_inode = os.stat(box_store.DEVICE_EVENTS_FILE).st_ino
+
+    assert [row[:2] for row in box.get_events()] == [["2025-07-12 10:30", True]]
+    assert os.stat(box_store.DEVICE_EVENTS_FILE).st_ino != legacy_inode
+    with open(box_store.DEVICE_EVENTS_FILE, encoding='utf-8') as f:
+        assert f.readline().strip() == ','.join(box_store.EVENT_COLUMNS)
+    assert not [name for name in os.listdir('.') if name.endswith('.tmp')]
+
+def test_replaced_events_file_is_reloaded_not_read_from_the_old_offset(box):
+    box.append_events([["2025-07-12 10:30:00", True, "", "", ""]])
+    assert len(box.get_events()) == 1
+
+    # Another process atomically replaces the file with a longer, different history
+    with open('replacement.csv', 'w', encoding='utf-8') as f:
+        f.write("timestamp,isConnected,deviceName,deviceId,eventId\n"
+                "2025-07-11 08:00:00,True,,,\n2025-07-11 09:00:00,False,,,\n")
+    os.replace('replacement.csv', box_store.DEVICE_EVENTS_FILE)
+
+    assert [row[0] for row in box.get_events()] == ["2025-07-11 08:00:00", "2025-07-11 09:00:00"]
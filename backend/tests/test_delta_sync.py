@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import box_store
+from app import app
+from recompute import recompute_box
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box_store._shards.clear()
+    box = box_store.get_box()
+    box.append_events([
+        ["2025-07-12 10:00:00", True, "", "", ""],
+        ["2025-07-12 10:30:00", False, "", "", ""],
+        ["2025-07-12 11:00:00", True, "", "", ""],
+        ["2025-07-12 11:45:00", False, "", "", ""],
+        ["2025-07-12 12:00:00", True, "", "", ""],
+    ])
+    yield app.test_client()
+    box_store._shards.clear()
+
+def get_sessions(client, since=None):
+    query = {'since': since} if since is not None else {}
+    return client.get('/api/device/sessions', query_string=query).get_json()
+
+def test_valid_cursor_returns_only_new_sessions_and_the_active_one(client):
+    first = get_sessions(client)
+    assert first["full"] is True
+    assert len(first["sessions"]) == 3
+
+    box_store.get_box().append_events([["2025-07-12 12:20:00", False, "", "", ""],
+                                       ["2025-07-12 13:00:00", True, "", "", ""]])
+    delta = get_sessions(client, first["cursor"])
+
+    assert delta["full"] is False
+    assert delta["sessionsOffset"] == 2
+    assert [session["start"] for session in delta["sessions"]] == ["2025-07-12T12:00:00", "2025-07-12T13:00:00"]
+    assert delta["sessions"][-1]["isActive"] is True
+
+def test_unchanged_history_still_sends_the_active_session(client):
+    cursor = get_sessions(client)["cursor"]
+    delta = get_sessions(client, cursor)
+
+    assert delta["full"] is False
+    assert delta["sessionsOffset"] == 2
+    assert len(delta["sessions"]) == 1
+    assert delta["sessions"][0]["isActive"] is True
+
+@pytest.mark.parametrize("cursor", ["garbage", "7:2025-07-12T11:45:00@", "2:2025-07-12T11:40:00@", "2:2025-07-12T11:45:00"])
+def test_stale_or_garbage_cursor_falls_back_to_a_full_reply(client, cursor):
+    reply = get_sessions(client, cursor)
+    assert reply["full"] is True
+    assert reply["sessionsOffset"] == 0
+    assert len(reply["sessions"]) == 3
+
+def test_recompute_invalidates_earlier_cursors(client):
+    recompute_box(period='day', workers=1)
+    cursor = get_sessions(client)["cursor"]
+
+    # A recompute under changed rules rewrites completed sessions but keeps the last one
+    history = recompute_box(period='day', workers=1)
+    history["sessions"][0]["end"] = "2025-07-12T10:20:00"
+    history["sessions"][0]["duration"] = 1200.0
+    history["generatedAt"] = "2099-01-01T00:00:00"
+    with open(box_store.SESSION_HISTORY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(history, f)
+
+    reply = get_sessions(client, cursor)
+    assert reply["full"] is True
+    assert reply["sessions"][0]["end"] == "2025-07-12T10:20:00"
+
+def test_stats_delta_matches_sessions_delta(client):
+    cursor = client.get('/api/device/stats').get_json()["cursor"]
+    delta = client.get('/api/device/stats', query_string={'since': cursor}).get_json()
+
+    assert delta["full"] is False
+    assert [session.get("isActive") for session in delta["sessions"]] == [True]
+    assert delta["cursor"] == cursor
@@ -0,0 +1,44 @@
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import box_store
+from heatmap import build_heatmap
+
+MONDAY = date(2025, 7, 14)
+NOW = datetime(2025, 7, 20, 23, 0)
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box_store._shards.clear()
+    yield box_store.get_box()
+    box_store._shards.clear()
+
+def monday_minutes(box, hour):
+    return build_heatmap(box, MONDAY, MONDAY + date.resolution * 6, now=NOW)["grid"][0][hour]
+
+def test_appended_events_are_folded_in(box):
+    box.append_events([["2025-07-14 10:00:00", True, "", "", ""], ["2025-07-14 10:30:00", False, "", "", ""]])
+    assert monday_minutes(box, 10) == 30.0
+
+    box.append_events([["2025-07-14 11:00:00", True, "", "", ""], ["2025-07-14 11:15:00", False, "", "", ""]])
+    assert monday_minutes(box, 10) == 30.0
+    assert monday_minutes(box, 11) == 15.0
+    assert box.hourly_buckets.processed == 4
+
+def test_rewritten_events_file_is_not_served_from_cache(box):
+    box.append_events([["2025-07-14 10:00:00", True, "", "", ""], ["2025-07-14 10:30:00", False, "", "", ""]])
+    assert monday_minutes(box, 10) == 30.0
+
+    # Another process rewrites the history with as many events as before
+    with open(box_store.DEVICE_EVENTS_FILE, 'w', encoding='utf-8') as f:
+        f.write("timestamp,isConnected,deviceName,deviceId,eventId\n"
+                "2025-07-14 08:00,True,,,\n2025-07-14 08:45,False,,,\n")
+
+    assert monday_minutes(box, 10) == 0.0
+    assert monday_minutes(box, 8) == 45.0
@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiler import format_collapsed, sample_stacks
+
+def spin_until(stop):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+def test_samples_are_root_first_and_named_after_the_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin_until, args=(stop,), name="zen-worker")
+    worker.start()
+    try:
+        counts, rounds = sample_stacks(0.1, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert rounds > 0
+    worker_stacks = [stack for stack in counts if stack.startswith("zen-worker;")]
+    assert worker_stacks
+    frames = worker_stacks[0].split(";")
+    assert frames[1].startswith("_bootstrap (threading.py:")
+    assert frames[-1].startswith("spin_until (test_profiler.py:")
+    # The sampling thread itself is never sampled
+    assert not any("sample_stacks" in stack for stack in counts)
+
+def test_excluded_threads_are_not_sampled():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin_until, args=(stop,), name="zen-excluded")
+    worker.start()
+    try:
+        counts, _ = sample_stacks(0.05, interval=0.005, exclude_thread_ids=[worker.ident])
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not any(stack.startswith("zen-excluded;") for stack in counts)
+
+def test_collapsed_format_lists_most_sampled_stacks_first():
+    counts = Counter({"main;a (x.py:1)": 2, "main;a (x.py:1);b (x.py:5)": 7})
+    assert format_collapsed(counts) == "main;a (x.py:1);b (x.py:5) 7\nmain;a (x.py:1) 2"
+
+def test_profile_endpoint_is_off_unless_enabled():
+    from app import app
+    response = app.test_client().get('/api/debug/profile?seconds=1')
+    assert response.status_code == 404
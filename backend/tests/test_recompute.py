@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import box_store
+from app import app
+from recompute import recompute_box
+from sessions import pair_sessions, add_to_daily_rollups
+
+# A session opened on Dec 30 stays open through partitions holding only repeated
+# connects, ends in a partition that also pairs sessions of its own, and a session
+# is still open after the last event
+EVENTS = [
+    ["2024-12-30 22:00:00", True],
+    ["2024-12-31 09:00:00", True],
+    ["2025-01-01 12:00:00", True],
+    ["2025-01-02 03:00:00", False],
+    ["2025-01-02 04:00:00", True],
+    ["2025-01-02 05:00:00", False],
+    ["2025-01-02 06:00:00", False],
+    ["2025-02-10 08:00:00", False],
+    ["2025-02-10 09:00:00", True],
+    ["2025-02-10 09:30:00", False],
+    ["2025-03-01 23:00:00", True],
+]
+
+def random_events(count=400, seed=3):
+    rng = random.Random(seed)
+    time = datetime(2023, 11, 20)
+    events = []
+    for _ in range(count):
+        time += timedelta(minutes=rng.expovariate(1 / 2000))
+        events.append([time.strftime("%Y-%m-%d %H:%M:%S"), rng.random() < 0.5])
+    return events
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box_store._shards.clear()
+    yield box_store.get_box()
+    box_store._shards.clear()
+
+@pytest.mark.parametrize("events", [EVENTS, random_events()], ids=["boundaries", "random"])
+@pytest.mark.parametrize("period", ["day", "month", "year"])
+@pytest.mark.parametrize("workers", [1, 4])
+def test_stitched_partitions_match_a_single_pass(box, events, period, workers):
+    box.append_events([[timestamp, connected, "", "", ""] for timestamp, connected in events])
+    expected_sessions, expected_open = pair_sessions(box.get_events())
+    expected_rollups = {}
+    for session in expected_sessions:
+        add_to_daily_rollups(expected_rollups, session)
+
+    history = recompute_box(period=period, workers=workers)
+
+    assert history["sessions"] == expected_sessions
+    assert history["openSessionStart"] == (expected_open.isoformat() if expected_open else None)
+    assert history["dailyRollups"] == dict(sorted(expected_rollups.items()))
+
+def test_stats_from_history_rollups_match_stats_from_events(box):
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=5)
+    events = []
+    for day in range(5):
+        for hour in (8, 13, 20):
+            connected_at = start + timedelta(days=day, hours=hour)
+            events.append([connected_at.strftime("%Y-%m-%d %H:%M:%S"), True, "", "", ""])
+            events.append([(connected_at + timedelta(minutes=47, seconds=30)).strftime("%Y-%m-%d %H:%M:%S"),
+                           False, "", "", ""])
+    box.append_events(events[:-6])
+    recompute_box(period='day', workers=1)
+    box.append_events(events[-6:])
+
+    client = app.test_client()
+    from_history = client.get('/api/device/stats').get_json()
+    os.remove(box_store.SESSION_HISTORY_FILE)
+    from_events = client.get('/api/device/stats').get_json()
+
+    for key in ("total_time", "zenPoints", "todayPoints", "todayZenTime", "weeklyData", "sessions"):
+        assert from_history[key] == from_events[key]
+    assert from_history["total_time"] == 15 * (47 * 60 + 30)
@@ -0,0 +1,78 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from static_assets import (IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, build_static_manifest,
+                           choose_encoding)
+
+BUNDLE = b"console.log('zen');" * 100
+STYLES = b"body { margin: 0; }\n" * 100
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'index.html').write_bytes(b"<html><body>zen</body></html>")
+    (tmp_path / 'bundle.3f2a9c1d.js').write_bytes(BUNDLE)
+    (tmp_path / 'bundle.3f2a9c1d.js.br').write_bytes(b"brotli bytes")
+    (tmp_path / 'bundle.3f2a9c1d.js.gz').write_bytes(gzip.compress(BUNDLE))
+    (tmp_path / 'styles.css').write_bytes(STYLES)
+    return tmp_path
+
+@pytest.fixture
+def client(dist, monkeypatch):
+    monkeypatch.setattr(app_module, 'static_manifest', build_static_manifest(str(dist)))
+    return app_module.app.test_client()
+
+def test_manifest_holds_precompressed_and_generated_variants(dist):
+    manifest = build_static_manifest(str(dist))
+
+    assert sorted(manifest) == ['bundle.3f2a9c1d.js', 'index.html', 'styles.css']
+    assert sorted(manifest['bundle.3f2a9c1d.js']['variants']) == ['br', 'gzip', 'identity']
+    assert gzip.decompress(manifest['styles.css']['variants']['gzip']) == STYLES
+    assert sorted(manifest['index.html']['variants']) == ['identity']  # too small to compress
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("", "identity"),
+])
+def test_choose_encoding_prefers_brotli_then_gzip(dist, accept, expected):
+    entry = build_static_manifest(str(dist))['bundle.3f2a9c1d.js']
+    with app_module.app.test_request_context(headers={'Accept-Encoding': accept}):
+        assert choose_encoding(entry, app_module.request.accept_encodings) == expected
+
+def test_served_variant_matches_accept_encoding(client):
+    response = client.get('/bundle.3f2a9c1d.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.data == b"brotli bytes"
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    response = client.get('/bundle.3f2a9c1d.js')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == BUNDLE
+
+def test_matching_if_none_match_gets_304(client):
+    etag = client.get('/styles.css', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get('/styles.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # The identity variant has its own ETag, so the gzip one doesn't validate it
+    response = client.get('/styles.css', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+def test_cache_control_by_filename(client):
+    assert client.get('/bundle.3f2a9c1d.js').headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert client.get('/styles.css').headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+    assert client.get('/index.html').headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+
+def test_unknown_paths_fall_back_to_index(client):
+    response = client.get('/settings')
+    assert response.status_code == 200
+    assert response.data == b"<html><body>zen</body></html>"
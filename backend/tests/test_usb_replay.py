@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usb_replay import replay, synthesize
+
+def test_repeated_replays_in_one_process_match():
+    trace = synthesize(devices=2, hours=6, seed=7)
+    first = replay(trace)
+    second = replay(trace)
+
+    for result in (first, second):
+        for key in ("wallSeconds", "ticksPerSecond", "speedup"):
+            result.pop(key)
+    assert first == second
+    assert first["missed"] == 0
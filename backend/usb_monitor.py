@@ -0,0 +1,344 @@
+"""Standalone USB device monitor process.
+
+Polls lsusb, logs phone connect/disconnect transitions for one box and serves
+its latest snapshot and recent transitions to the web workers over a Unix
+socket. A lock file keeps a single monitor running per socket, so Flask's
+reloader or several WSGI workers can all ask for one without racing on the CSV.
+
+    python backend/usb_monitor.py --box default
+"""
+import argparse
+import collections
+import fcntl
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from profiler import profile_lock, sample_stacks, PROFILE_MAX_SECONDS
+from box_store import (DEFAULT_BOX_ID, get_box, should_log_connection,
+                       should_log_disconnection, log_device_event, get_all_known_devices)
+
+# USB Device Monitor Configuration
+USB_CHECK_INTERVAL = 3  # Check every 3 seconds
+PHONE_PATTERNS = [
+    r'iPhone|iPad|iPod',  # Apple devices
+    r'Samsung|Galaxy',    # Samsung devices
+    r'Google|Pixel',      # Google devices
+    r'OnePlus',          # OnePlus devices
+    r'Huawei|Honor',     # Huawei devices
+    r'Xiaomi|Mi|Redmi',  # Xiaomi devices
+    r'LG.*Phone',        # LG phones
+    r'HTC',              # HTC devices
+    r'Sony.*Xperia',     # Sony devices
+    r'Motorola|Moto',    # Motorola devices
+    r'Nokia',            # Nokia devices
+    r'OPPO|Vivo',        # OPPO/Vivo devices
+]
+
+# Local IPC channel between the monitor process and the web workers
+MONITOR_SOCKET = os.environ.get('ZENBOX_MONITOR_SOCKET',
+                                os.path.join(tempfile.gettempdir(), 'zenbox-monitor.sock'))
+MONITOR_IPC_TIMEOUT = 2  # seconds to wait for the monitor to answer a command
+MONITOR_START_TIMEOUT = 5  # seconds to wait for a spawned monitor to accept commands
+MAX_RECENT_TRANSITIONS = 100
+
+def get_usb_devices():
+    """Get list of connected USB devices using lsusb"""
+    try:
+        # Run lsusb command
+        result = subprocess.run(['lsusb'], capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return result.stdout.strip().split('\n')
+        else:
+            print(f"lsusb command failed with return code {result.returncode}")
+            return []
+    except subprocess.TimeoutExpired:
+        print("lsusb command timed out")
+        return []
+    except FileNotFoundError:
+        print("lsusb command not found. Make sure usbutils is installed.")
+        return []
+    except Exception as e:
+        print(f"Error running lsusb: {e}")
+        return []
+
+def extract_device_info(lsusb_line):
+    """Extract device ID and name from lsusb output line"""
+    try:
+        # lsusb output format: "Bus 001 Device 002: ID 1234:5678 Device Name"
+        # We want to extract both the device ID and name
+        parts = lsusb_line.split(': ID ')
+        if len(parts) > 1:
+            # Get everything after "ID "
+            device_part = parts[1]
+            # Split into ID and name parts
+            id_and_name = device_part.split(' ', 1)
+            if len(id_and_name) >= 2:
+                device_id = id_and_name[0].strip()  # e.g., "1234:5678"
+                device_name = id_and_name[1].strip()  # e.g., "Device Name"
+                return device_id, device_name
+            elif len(id_and_name) == 1:
+                # Only ID available, no name
+                device_id = id_and_name[0].strip()
+                return device_id, ""
+        return "", ""
+    except Exception as e:
+        print(f"Error extracting device info from '{lsusb_line}': {e}")
+        return "", ""
+
+def is_phone_device(device_name):
+    """Check if device name matches phone patterns"""
+    if not device_name:
+        return False
+    
+    for pattern in PHONE_PATTERNS:
+        if re.search(pattern, device_name, re.IGNORECASE):
+            return True
+    return False
+
+def get_connected_phones(usb_devices=None):
+    """Get dict of currently connected phone devices (deduplicated by device ID)"""
+    phones = {}  # device_id -> device_name mapping
+    if usb_devices is None:
+        usb_devices = get_usb_devices()
+    
+    for device_line in usb_devices:
+        device_id, device_name = extract_device_info(device_line)
+        if device_id and device_name and is_phone_device(device_name):
+            # Use device ID as key to prevent duplicates
+            # If we already have this device ID, prefer the one with more descriptive name
+            if device_id not in phones or len(device_name) > len(phones[device_id]):
+                phones[device_id] = device_name
+    
+    return phones
+
+class DeviceMonitor:
+    """Scans for phones and logs their transitions into a box's event log"""
+
+    def __init__(self, box, list_devices=get_usb_devices, check_interval=USB_CHECK_INTERVAL,
+                 clock=datetime.now, verbose=True):
+        self.box = box
+        self.list_devices = list_devices  # returns lsusb output lines
+        self.check_interval = check_interval
+        self.clock = clock  # returns the datetime transitions are logged at
+        self.verbose = verbose
+        self.running = False
+        self.lock = threading.Lock()
+        self.connected = {}  # device_id -> device_name from the latest scan
+        self.last_scan = None
+        self.seq = 0
+        self.transitions = collections.deque(maxlen=MAX_RECENT_TRANSITIONS)
+
+    def record_transition(self, is_connected, device_id, device_name, timestamp):
+        with self.lock:
+            self.seq += 1
+            self.transitions.append({
+                "seq": self.seq,
+                "timestamp": timestamp,
+                "isConnected": is_connected,
+                "deviceId": device_id,
+                "deviceName": device_name
+            })
+
+    def tick(self):
+        """Scan once and log any connections or disconnections"""
+        current_phones = get_connected_phones(self.list_devices())
+        # Get all devices that have been seen before
+        previously_seen_devices = get_all_known_devices(self.box)
+        now = self.clock().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Check for newly connected devices
+        for device_id, device_name in current_phones.items():
+            if should_log_connection(self.box, device_id, device_name):
+                try:
+                    log_device_event(self.box, True, device_name, device_id, now)
+                    self.record_transition(True, device_id, device_name, now)
+                    if self.verbose:
+                        print(f"Auto-detected connection: {device_name} (ID: {device_id})")
+                except Exception as e:
+                    print(f"Error logging connection for {device_name}: {e}")
+
+        # Check for disconnected devices
+        for device_id, device_name in previously_seen_devices.items():
+            # If device was previously seen but not currently connected
+            if device_id not in current_phones:
+                if should_log_disconnection(self.box, device_id, device_name):
+                    try:
+                        log_device_event(self.box, False, device_name, device_id, now)
+                        self.record_transition(False, device_id, device_name, now)
+                        if self.verbose:
+                            print(f"Auto-detected disconnection: {device_name} (ID: {device_id})")
+                    except Exception as e:
+                        print(f"Error logging disconnection for {device_name}: {e}")
+
+        with self.lock:
+            self.connected = current_phones
+            self.last_scan = now
+
+    def run(self, stop_event):
+        """Scan every check_interval seconds while running, until stop_event is set"""
+        print(f"USB Device Monitor started for box {self.box.box_id}")
+        while not stop_event.is_set():
+            if self.running:
+                try:
+                    self.tick()
+                except Exception as e:
+                    # Continue monitoring even if there's an error
+                    print(f"Error in device monitor: {e}")
+            stop_event.wait(self.check_interval)
+        print("USB Device Monitor stopped")
+
+    def status(self):
+        with self.lock:
+            return {
+                "monitoring": self.running,
+                "boxId": self.box.box_id,
+                "pid": os.getpid(),
+                "connectedDevices": list(self.connected.values()),
+                "connectedDeviceIds": list(self.connected.keys()),
+                "deviceMapping": dict(self.connected),
+                "lastScan": self.last_scan,
+                "lastSeq": self.seq,
+                "checkInterval": self.check_interval,
+                "phonePatterns": PHONE_PATTERNS
+            }
+
+    def transitions_since(self, since):
+        with self.lock:
+            return [t for t in self.transitions if t["seq"] > since]
+
+class MonitorRequestHandler(socketserver.StreamRequestHandler):
+    """Answers newline-delimited JSON commands from the web workers"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                reply = self.server.dispatch(message.get("command"), message)
+            except Exception as e:
+                reply = {"status": "error", "message": str(e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+class MonitorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, monitor, stop_event):
+        self.monitor = monitor
+        self.stop_event = stop_event
+        super().__init__(path, MonitorRequestHandler)
+
+    def dispatch(self, command, message):
+        if command == "status":
+            return {"status": "success", **self.monitor.status()}
+        if command == "start":
+            self.monitor.running = True
+            return {"status": "success", "message": "Device monitoring started", "monitoring": True}
+        if command == "stop":
+            self.monitor.running = False
+            return {"status": "success", "message": "Device monitoring stopped", "monitoring": False}
+        if command == "transitions":
+            since = int(message.get("since", 0))
+            return {"status": "success", "lastSeq": self.monitor.seq,
+                    "transitions": self.monitor.transitions_since(since)}
+        if command == "profile":
+            seconds = min(float(message.get("seconds", 5)), PROFILE_MAX_SECONDS)
+            if not profile_lock.acquire(blocking=False):
+                return {"status": "error", "message": "A profile is already running"}
+            try:
+                counts, rounds = sample_stacks(seconds)
+            finally:
+                profile_lock.release()
+            return {"status": "success", "pid": os.getpid(), "samples": rounds, "stacks": dict(counts)}
+        if command == "shutdown":
+            self.stop_event.set()
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"status": "success", "message": "Monitor process shutting down"}
+        return {"status": "error", "message": f"Unknown command: {command}"}
+
+def acquire_instance_lock(socket_path):
+    """Take the single-instance lock for a socket path; None if another monitor holds it"""
+    lock_file = open(socket_path + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+def send_monitor_command(command, socket_path=MONITOR_SOCKET, timeout=MONITOR_IPC_TIMEOUT, **params):
+    """Send a command to the monitor process; returns its reply, or None if it is not running"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall(json.dumps({"command": command, **params}).encode('utf-8') + b'\n')
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                reply += chunk
+        return json.loads(reply) if reply else None
+    except (OSError, ValueError):
+        return None
+
+def spawn_monitor_process(box_id=DEFAULT_BOX_ID, socket_path=MONITOR_SOCKET):
+    """Start a monitor process unless one is already answering; True once it is reachable.
+
+    Racing spawns are harmless: all but one exit on the instance lock.
+    """
+    if send_monitor_command("status", socket_path) is not None:
+        return True
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), '--box', box_id,
+                      '--socket', socket_path])
+    deadline = time.time() + MONITOR_START_TIMEOUT
+    while time.time() < deadline:
+        if send_monitor_command("status", socket_path) is not None:
+            return True
+        time.sleep(0.1)
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Zenbox USB device monitor")
+    parser.add_argument('--box', default=os.environ.get('ZENBOX_BOX_ID', DEFAULT_BOX_ID),
+                        help='Box ID to record events for')
+    parser.add_argument('--socket', default=MONITOR_SOCKET, help='Unix socket path to serve on')
+    parser.add_argument('--paused', action='store_true', help='Start without scanning')
+    args = parser.parse_args()
+
+    lock_file = acquire_instance_lock(args.socket)
+    if lock_file is None:
+        print(f"Another USB monitor is already serving {args.socket}")
+        return
+
+    # A socket left behind by a crashed monitor would make bind fail
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    stop_event = threading.Event()
+    monitor = DeviceMonitor(get_box(args.box))
+    monitor.running = not args.paused
+    server = MonitorServer(args.socket, monitor, stop_event)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"USB monitor listening on {args.socket}")
+
+    try:
+        monitor.run(stop_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        lock_file.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Replay recorded or synthetic lsusb traces through the USB monitor on a virtual clock.
+
+A trace is JSON lines, one lsusb snapshot per line, each holding until the next:
+
+    {"t": 0, "devices": ["Bus 001 Device 002: ID 1d6b:0002 Linux Foundation 2.0 root hub"]}
+    {"t": 42.5, "devices": ["...", "Bus 001 Device 005: ID 05ac:12a8 Apple, Inc. iPhone"]}
+
+`t` is seconds from the start. A snapshot may also carry "phones", the device IDs
+truly connected at that time; otherwise the truth is derived from the lines.
+
+    python backend/usb_replay.py record trace.jsonl --seconds 600
+    python backend/usb_replay.py synthesize trace.jsonl --devices 3 --hours 72
+    python backend/usb_replay.py replay trace.jsonl
+
+Replay ticks DeviceMonitor as fast as it can, advancing a virtual clock by the
+check interval per tick, against a throwaway box in a temporary directory, and
+reports detection latency, missed and duplicate transitions and ticks per second.
+"""
+import argparse
+import bisect
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from box_store import BoxShard
+from usb_monitor import DeviceMonitor, USB_CHECK_INTERVAL, get_usb_devices, get_connected_phones
+
+# Virtual time the replay clock starts at, so logged events have stable timestamps
+REPLAY_EPOCH = datetime(2025, 1, 1)
+
+ROOT_HUB_LINE = "Bus 001 Device 001: ID 1d6b:0002 Linux Foundation 2.0 root hub"
+SYNTHETIC_PHONES = [
+    ("05ac:12a8", "Apple, Inc. iPhone 5/5C/5S/6/SE"),
+    ("18d1:4ee7", "Google Inc. Pixel 7"),
+    ("04e8:6860", "Samsung Electronics Co., Ltd Galaxy series"),
+    ("2717:ff48", "Xiaomi Inc. Redmi Note 10 Pro"),
+    ("22b8:2e82", "Motorola PCS Moto G"),
+]
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        trace = [json.loads(line) for line in f if line.strip()]
+    trace.sort(key=lambda snapshot: snapshot["t"])
+    return trace
+
+def save_trace(path, trace):
+    with open(path, 'w', encoding='utf-8') as f:
+        for snapshot in trace:
+            f.write(json.dumps(snapshot) + "\n")
+
+def true_phones(snapshot):
+    if "phones" in snapshot:
+        return set(snapshot["phones"])
+    return set(get_connected_phones(snapshot["devices"]))
+
+def expected_transitions(trace):
+    """Ground-truth (t, device_id, is_connected) transitions between consecutive snapshots"""
+    transitions = []
+    previous = set()
+    for snapshot in trace:
+        current = true_phones(snapshot)
+        for device_id in sorted(current - previous):
+            transitions.append((snapshot["t"], device_id, True))
+        for device_id in sorted(previous - current):
+            transitions.append((snapshot["t"], device_id, False))
+        previous = current
+    return transitions
+
+def match_transitions(expected, observed):
+    """Pair each expected transition with the first later observation of it.
+
+    An observation only counts for an expected transition if it comes before the
+    same device's next expected transition. Returns (latencies, missed, duplicates).
+    """
+    by_device = {}
+    for t, device_id, is_connected in expected:
+        by_device.setdefault(device_id, {"expected": [], "observed": []})["expected"].append((t, is_connected))
+    for t, device_id, is_connected in observed:
+        by_device.setdefault(device_id, {"expected": [], "observed": []})["observed"].append((t, is_connected))
+
+    latencies = []
+    missed = []
+    duplicates = []
+    for device_id, device in by_device.items():
+        observations = list(device["observed"])
+        used = [False] * len(observations)
+        expected_times = [t for t, _ in device["expected"]] + [float('inf')]
+        for index, (t, is_connected) in enumerate(device["expected"]):
+            deadline = expected_times[index + 1]
+            for i, (observed_t, observed_connected) in enumerate(observations):
+                if not used[i] and observed_connected == is_connected and t <= observed_t < deadline:
+                    used[i] = True
+                    latencies.append(observed_t - t)
+                    break
+            else:
+                missed.append((t, device_id, is_connected))
+        duplicates.extend((t, device_id, c) for (t, c), u in zip(observations, used) if not u)
+    return latencies, missed, duplicates
+
+def describe_transition(transition):
+    t, device_id, is_connected = transition
+    return {"t": t, "deviceId": device_id, "isConnected": is_connected}
+
+def replay(trace, check_interval=USB_CHECK_INTERVAL, duration=None):
+    """Run the monitor over a trace on a virtual clock and measure its detection"""
+    times = [snapshot["t"] for snapshot in trace]
+    if duration is None:
+        duration = (times[-1] if times else 0) + 2 * check_interval
+    virtual = {"t": 0.0}
+
+    def list_devices():
+        index = bisect.bisect_right(times, virtual["t"]) - 1
+        return trace[index]["devices"] if index >= 0 else []
+
+    with tempfile.TemporaryDirectory(prefix='zenbox-replay-') as work_dir:
+        # A fresh, unregistered box in the temp dir keeps the replay's events out of real data
+        # and out of the shard registry, so every replay starts empty
+        monitor = DeviceMonitor(BoxShard('replay', base_dir=work_dir), list_devices=list_devices,
+                                check_interval=check_interval,
+                                clock=lambda: REPLAY_EPOCH + timedelta(seconds=virtual["t"]),
+                                verbose=False)
+        observed = []
+        ticks = 0
+        started = time.perf_counter()
+        while virtual["t"] <= duration:
+            last_seq = monitor.seq
+            monitor.tick()
+            for transition in monitor.transitions_since(last_seq):
+                observed.append((virtual["t"], transition["deviceId"], transition["isConnected"]))
+            ticks += 1
+            virtual["t"] += check_interval
+        wall_seconds = time.perf_counter() - started
+
+    expected = expected_transitions(trace)
+    latencies, missed, duplicates = match_transitions(expected, observed)
+    return {
+        "ticks": ticks,
+        "virtualSeconds": duration,
+        "wallSeconds": round(wall_seconds, 3),
+        "ticksPerSecond": round(ticks / wall_seconds, 1) if wall_seconds else None,
+        "speedup": round(duration / wall_seconds, 1) if wall_seconds else None,
+        "expectedTransitions": len(expected),
+        "detectedTransitions": len(latencies),
+        "missed": len(missed),
+        "duplicates": len(duplicates),
+        "latency": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(statistics.median(latencies), 3),
+            "p95": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 3),
+            "max": round(max(latencies), 3),
+        } if latencies else None,
+        "missedTransitions": [describe_transition(t) for t in missed[:20]],
+        "duplicateTransitions": [describe_transition(t) for t in duplicates[:20]],
+    }
+
+def synthesize(devices=2, hours=24, mean_session=1800, mean_gap=3600, glitch_rate=0.05, seed=None):
+    """Random plug/unplug trace; glitch_rate is the share of sessions shorter than a check interval"""
+    rng = random.Random(seed)
+    phones = SYNTHETIC_PHONES[:devices]
+    end = hours * 3600
+    changes = {}  # t -> {device_id: connected}
+    for device_id, _ in phones:
+        t = rng.expovariate(1 / mean_gap)
+        while t < end:
+            length = rng.uniform(0.2, USB_CHECK_INTERVAL * 0.9) if rng.random() < glitch_rate \
+                else rng.expovariate(1 / mean_session)
+            changes.setdefault(round(t, 3), {})[device_id] = True
+            changes.setdefault(round(t + length, 3), {})[device_id] = False
+            t += length + rng.expovariate(1 / mean_gap)
+
+    names = dict(phones)
+    connected = set()
+    trace = [{"t": 0, "devices": [ROOT_HUB_LINE], "phones": []}]
+    for t in sorted(changes):
+        for device_id, is_connected in changes[t].items():
+            (connected.add if is_connected else connected.discard)(device_id)
+        lines = [ROOT_HUB_LINE] + [f"Bus 001 Device {i + 2:03d}: ID {device_id} {names[device_id]}"
+                                   for i, device_id in enumerate(sorted(connected))]
+        trace.append({"t": t, "devices": lines, "phones": sorted(connected)})
+    return trace
+
+def record(seconds, interval=1.0):
+    """Poll the real lsusb and keep a snapshot whenever its output changes"""
+    trace = []
+    started = time.monotonic()
+    while time.monotonic() - started < seconds:
+        devices = get_usb_devices()
+        if not trace or devices != trace[-1]["devices"]:
+            trace.append({"t": round(time.monotonic() - started, 3), "devices": devices})
+        time.sleep(interval)
+    return trace
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay lsusb traces through the USB monitor")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help='Replay a trace and report detection metrics')
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--interval', type=float, default=USB_CHECK_INTERVAL,
+                               help='Virtual seconds between monitor ticks')
+    replay_parser.add_argument('--duration', type=float, help='Virtual seconds to replay')
+
+    synth_parser = commands.add_parser('synthesize', help='Write a random plug/unplug trace')
+    synth_parser.add_argument('trace')
+    synth_parser.add_argument('--devices', type=int, default=2, choices=range(1, len(SYNTHETIC_PHONES) + 1))
+    synth_parser.add_argument('--hours', type=float, default=24)
+    synth_parser.add_argument('--mean-session', type=float, default=1800, help='Mean session seconds')
+    synth_parser.add_argument('--mean-gap', type=float, default=3600, help='Mean seconds between sessions')
+    synth_parser.add_argument('--glitch-rate', type=float, default=0.05,
+                              help='Share of sessions shorter than a check interval')
+    synth_parser.add_argument('--seed', type=int)
+
+    record_parser = commands.add_parser('record', help='Record real lsusb snapshots')
+    record_parser.add_argument('trace')
+    record_parser.add_argument('--seconds', type=float, default=300)
+    record_parser.add_argument('--interval', type=float, default=1.0)
+
+    args = parser.parse_args()
+    if args.command == 'replay':
+        print(json.dumps(replay(load_trace(args.trace), args.interval, args.duration), indent=2))
+    elif args.command == 'synthesize':
+        trace = synthesize(args.devices, args.hours, args.mean_session, args.mean_gap,
+                           args.glitch_rate, args.seed)
+        save_trace(args.trace, trace)
+        print(f"Wrote {len(trace)} snapshots to {args.trace}")
+    else:
+        trace = record(args.seconds, args.interval)
+        save_trace(args.trace, trace)
+        print(f"Recorded {len(trace)} snapshots to {args.trace}")
+
+if __name__ == '__main__':
+    main()
@@ -1,99 +1,10 @@
-import React, { createContext, useContext, useReducer, useEffect } from 'react';
-
-const API_URL = 'http://localhost:8182/api';
-
-// Initial state
-const initialState = {
-  // UI State
-  currentScreen: 'home',
-  isLoading: false,
-  error: null,
-  
-  // Zen Mode State
-  isZenMode: false,
-  
-  // Settings (will be loaded from backend)
-  dailyTarget: 120, // minutes
-  weeklyTarget: 840, // minutes
-  settings: {
-    autoReminder: true,
-    callFiltering: true,
-    zenHours: '20:00-22:00',
-    zenDays: ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-  },
-  
-  // Data (calculated by backend)
-  stats: null,
-  todayZenTime: 0, // minutes
-  zenPoints: 0,
-  todayPoints: 0,
-  weeklyData: []
-};
+import React, { createContext, useContext, useReducer, useEffect, useRef } from 'react';
+import { initialState, actionTypes, zenboxReducer } from './zenboxReducer';
 
-// Action types
-const actionTypes = {
-  SET_LOADING: 'SET_LOADING',
-  SET_ERROR: 'SET_ERROR',
-  SET_CURRENT_SCREEN: 'SET_CURRENT_SCREEN',
-  SET_ZEN_MODE: 'SET_ZEN_MODE',
-  SET_DAILY_TARGET: 'SET_DAILY_TARGET',
-  SET_WEEKLY_TARGET: 'SET_WEEKLY_TARGET',
-  UPDATE_SETTINGS: 'UPDATE_SETTINGS',
-  SET_STATS_DATA: 'SET_STATS_DATA',
-  SET_CONFIG_DATA: 'SET_CONFIG_DATA'
-};
-
-// Reducer
-const zenboxReducer = (state, action) => {
-  switch (action.type) {
-    case actionTypes.SET_LOADING:
-      return { ...state, isLoading: action.payload };
-    
-    case actionTypes.SET_ERROR:
-      return { ...state, error: action.payload };
-    
-    case actionTypes.SET_CURRENT_SCREEN:
-      return { ...state, currentScreen: action.payload };
-    
-    case actionTypes.SET_ZEN_MODE:
-      return { ...state, isZenMode: action.payload };
-    
-    case actionTypes.SET_DAILY_TARGET:
-      return { ...state, dailyTarget: action.payload };
-    
-    case actionTypes.SET_WEEKLY_TARGET:
-      return { ...state, weeklyTarget: action.payload };
-    
-    case actionTypes.UPDATE_SETTINGS:
-      return { 
-        ...state, 
-        settings: { ...state.settings, ...action.payload } 
-      };
-    
-    case actionTypes.SET_STATS_DATA:
-      return { 
-        ...state, 
-        stats: action.payload.stats,
-        isZenMode: action.payload.isZenMode,
-        todayZenTime: action.payload.todayZenTime,
-        zenPoints: action.payload.zenPoints,
-        todayPoints: action.payload.todayPoints,
-        weeklyData: action.payload.weeklyData,
-        dailyTarget: action.payload.dailyTarget
-      };
-    
-    case actionTypes.SET_CONFIG_DATA:
-      return {
-        ...state,
-        dailyTarget: action.payload.dailyTarget,
-        weeklyTarget: action.payload.weeklyTarget,
-        settings: action.payload.settings
-      };
-    
-    default:
-      return state;
-  }
-};
+const API_BASE = 'http://localhost:8182/api';
+// Optional ?box=<id> selects a box; without it the legacy default-box routes are used
+const BOX_ID = new URLSearchParams(window.location.search).get('box');
+const API_URL = BOX_ID ? `${API_BASE}/boxes/${encodeURIComponent(BOX_ID)}` : API_BASE;
 
 // Context
 const ZenboxContext = createContext();
@@ -101,18 +12,28 @@ const ZenboxContext = createContext();
 // Provider component
 export const ZenboxProvider = ({ children }) => {
   const [state, dispatch] = useReducer(zenboxReducer, initialState);
+  // Cursor from the last stats response, so polls only fetch changed sessions
+  const statsCursorRef = useRef(null);
 
   // API Functions
   const fetchStats = async () => {
     try {
       dispatch({ type: actionTypes.SET_LOADING, payload: true });
-      const response = await fetch(`${API_URL}/device/stats`);
+      const since = statsCursorRef.current;
+      const query = since ? `?since=${encodeURIComponent(since)}` : '';
+      const response = await fetch(`${API_URL}/device/stats${query}`);
       const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error || `Stats request failed (${response.status})`);
+      }
+      statsCursorRef.current = data.cursor || null;
       
       dispatch({ 
         type: actionTypes.SET_STATS_DATA, 
         payload: {
           stats: data.sessions,
+          full: data.full !== false,
+          sessionsOffset: data.sessionsOffset || 0,
           isZenMode: data.isZenMode,
           todayZenTime: data.todayZenTime,
           zenPoints: data.zenPoints,
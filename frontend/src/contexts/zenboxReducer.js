@@ -0,0 +1,95 @@
+// Initial state
+export const initialState = {
+  // UI State
+  currentScreen: 'home',
+  isLoading: false,
+  error: null,
+  
+  // Zen Mode State
+  isZenMode: false,
+  
+  // Settings (will be loaded from backend)
+  dailyTarget: 120, // minutes
+  weeklyTarget: 840, // minutes
+  settings: {
+    autoReminder: true,
+    callFiltering: true,
+    zenHours: '20:00-22:00',
+    zenDays: ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+  },
+  
+  // Data (calculated by backend)
+  stats: null,
+  todayZenTime: 0, // minutes
+  zenPoints: 0,
+  todayPoints: 0,
+  weeklyData: []
+};
+
+// Action types
+export const actionTypes = {
+  SET_LOADING: 'SET_LOADING',
+  SET_ERROR: 'SET_ERROR',
+  SET_CURRENT_SCREEN: 'SET_CURRENT_SCREEN',
+  SET_ZEN_MODE: 'SET_ZEN_MODE',
+  SET_DAILY_TARGET: 'SET_DAILY_TARGET',
+  SET_WEEKLY_TARGET: 'SET_WEEKLY_TARGET',
+  UPDATE_SETTINGS: 'UPDATE_SETTINGS',
+  SET_STATS_DATA: 'SET_STATS_DATA',
+  SET_CONFIG_DATA: 'SET_CONFIG_DATA'
+};
+
+// Reducer
+export const zenboxReducer = (state, action) => {
+  switch (action.type) {
+    case actionTypes.SET_LOADING:
+      return { ...state, isLoading: action.payload };
+    
+    case actionTypes.SET_ERROR:
+      return { ...state, error: action.payload };
+    
+    case actionTypes.SET_CURRENT_SCREEN:
+      return { ...state, currentScreen: action.payload };
+    
+    case actionTypes.SET_ZEN_MODE:
+      return { ...state, isZenMode: action.payload };
+    
+    case actionTypes.SET_DAILY_TARGET:
+      return { ...state, dailyTarget: action.payload };
+    
+    case actionTypes.SET_WEEKLY_TARGET:
+      return { ...state, weeklyTarget: action.payload };
+    
+    case actionTypes.UPDATE_SETTINGS:
+      return { 
+        ...state, 
+        settings: { ...state.settings, ...action.payload } 
+      };
+    
+    case actionTypes.SET_STATS_DATA:
+      return { 
+        ...state, 
+        // Delta responses carry only sessions after sessionsOffset; keep the ones before it
+        stats: action.payload.full
+          ? action.payload.stats
+          : (state.stats || []).slice(0, action.payload.sessionsOffset).concat(action.payload.stats),
+        isZenMode: action.payload.isZenMode,
+        todayZenTime: action.payload.todayZenTime,
+        zenPoints: action.payload.zenPoints,
+        todayPoints: action.payload.todayPoints,
+        weeklyData: action.payload.weeklyData,
+        dailyTarget: action.payload.dailyTarget
+      };
+    
+    case actionTypes.SET_CONFIG_DATA:
+      return {
+        ...state,
+        dailyTarget: action.payload.dailyTarget,
+        weeklyTarget: action.payload.weeklyTarget,
+        settings: action.payload.settings
+      };
+    
+    default:
+      return state;
+  }
+};
@@ -0,0 +1,50 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+import { initialState, actionTypes, zenboxReducer } from './zenboxReducer.js';
+
+const session = (start, end, isActive) => ({ start, end, duration: 60, ...(isActive ? { isActive } : {}) });
+
+const statsPayload = (stats, extra) => ({
+  stats,
+  full: true,
+  sessionsOffset: 0,
+  isZenMode: false,
+  todayZenTime: 5,
+  zenPoints: 300,
+  todayPoints: 300,
+  weeklyData: [],
+  dailyTarget: 120,
+  ...extra
+});
+
+const setStats = (state, payload) => zenboxReducer(state, { type: actionTypes.SET_STATS_DATA, payload });
+
+test('a full stats reply replaces the sessions', () => {
+  const state = setStats({ ...initialState, stats: [session('a', 'b')] },
+    statsPayload([session('c', 'd'), session('e', 'f')]));
+  assert.deepEqual(state.stats, [session('c', 'd'), session('e', 'f')]);
+  assert.equal(state.zenPoints, 300);
+});
+
+test('a delta keeps sessions before sessionsOffset and replaces the active one', () => {
+  const held = setStats(initialState, statsPayload([session('1', '2'), session('3', '4'), session('5', '6', true)]));
+  const state = setStats(held, statsPayload([session('5', '7'), session('8', '9', true)],
+    { full: false, sessionsOffset: 2, zenPoints: 420 }));
+
+  assert.deepEqual(state.stats, [session('1', '2'), session('3', '4'), session('5', '7'), session('8', '9', true)]);
+  assert.equal(state.zenPoints, 420);
+});
+
+test('a delta with only the active session updates its duration in place', () => {
+  const held = setStats(initialState, statsPayload([session('1', '2'), session('5', '6', true)]));
+  const state = setStats(held, statsPayload([{ ...session('5', '8', true), duration: 180 }],
+    { full: false, sessionsOffset: 1 }));
+
+  assert.equal(state.stats.length, 2);
+  assert.equal(state.stats[1].duration, 180);
+});
+
+test('a delta before any full reply starts from no sessions', () => {
+  const state = setStats(initialState, statsPayload([session('5', '6', true)], { full: false, sessionsOffset: 0 }));
+  assert.deepEqual(state.stats, [session('5', '6', true)]);
+});